@@ -0,0 +1,103 @@
+from pyray import *
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+# Gameplay capture for QA clips. The render thread only reads the frame
+# back into a pooled buffer and queues it; encoding and disk writes happen
+# on worker threads. When every buffer is still in flight the frame is
+# dropped and counted instead of stalling the game.
+FORMAT_PNG = "png"
+FORMAT_RAW = "raw"
+
+def encode_png(pixels, width, height, level=1):
+    # Minimal RGBA8 PNG writer; zlib releases the GIL while compressing
+    stride = width * 4
+    view = memoryview(pixels)
+    rows = bytearray((stride + 1) * height)
+    for y in range(height):
+        start = y * (stride + 1) + 1
+        rows[start:start + stride] = view[y * stride:(y + 1) * stride]
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data +
+                struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(bytes(rows), level)) + chunk(b"IEND", b""))
+
+class FrameCapture:
+    def __init__(self, directory, width, height, format=FORMAT_PNG,
+                 buffers=6, workers=2):
+        self.directory = directory
+        self.width = width
+        self.height = height
+        self.format = format
+        self.frame_size = width * height * 4
+        self.free_buffers = queue.SimpleQueue()
+        for _ in range(buffers):
+            self.free_buffers.put(bytearray(self.frame_size))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="capture")
+        self.active = False
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.counter_lock = threading.Lock()
+        self.last_readback_ms = 0.0
+
+    def toggle(self):
+        self.active = not self.active
+        if self.active:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def capture(self, frame_number):
+        # Call after everything is drawn and before end_drawing()
+        if not self.active:
+            return False
+        try:
+            buffer = self.free_buffers.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+
+        start = time.perf_counter()
+        rl_draw_render_batch_active()
+        pixels = rl_read_screen_pixels(self.width, self.height)
+        ffi.memmove(buffer, pixels, self.frame_size)
+        mem_free(pixels)
+        self.last_readback_ms = (time.perf_counter() - start) * 1000.0
+
+        self.captured += 1
+        self.executor.submit(self.write_frame, buffer, frame_number)
+        return True
+
+    def write_frame(self, buffer, frame_number):
+        try:
+            if self.format == FORMAT_PNG:
+                path = os.path.join(self.directory, f"frame-{frame_number:06d}.png")
+                data = encode_png(buffer, self.width, self.height)
+            else:
+                path = os.path.join(
+                    self.directory,
+                    f"frame-{frame_number:06d}-{self.width}x{self.height}.rgba"
+                )
+                data = buffer
+            with open(path, "wb") as f:
+                f.write(data)
+            with self.counter_lock:
+                self.written += 1
+        except OSError:
+            with self.counter_lock:
+                self.errors += 1
+        finally:
+            self.free_buffers.put(buffer)
+
+    def close(self):
+        self.active = False
+        self.executor.shutdown(wait=True)
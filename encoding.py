@@ -0,0 +1,42 @@
+# Shared compact encodings for network snapshots and replays
+
+# Positions travel in millimetres, velocities in centimetres per second
+POSITION_SCALE = 1000.0
+VELOCITY_SCALE = 100.0
+
+def quantise_state(position, velocity):
+    return (
+        int(round(position.x * POSITION_SCALE)),
+        int(round(position.y * POSITION_SCALE)),
+        int(round(position.z * POSITION_SCALE)),
+        max(-32768, min(32767, int(round(velocity.x * VELOCITY_SCALE)))),
+        max(-32768, min(32767, int(round(velocity.y * VELOCITY_SCALE)))),
+        max(-32768, min(32767, int(round(velocity.z * VELOCITY_SCALE)))),
+    )
+
+def dequantise_state(state):
+    return (
+        state[0] / POSITION_SCALE, state[1] / POSITION_SCALE, state[2] / POSITION_SCALE,
+        state[3] / VELOCITY_SCALE, state[4] / VELOCITY_SCALE, state[5] / VELOCITY_SCALE,
+    )
+
+def write_varint(out, value):
+    # Zigzag so small negative deltas stay small
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    value = value >> 1 if not value & 1 else -(value >> 1) - 1
+    return value, offset
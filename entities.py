@@ -0,0 +1,159 @@
+import numpy as np
+
+# Entity-component store. Every obstacle, power-up and particle of a level
+# is a slot index into parallel NumPy columns grouped by component, so the
+# systems in systems.py work on whole columns at once instead of walking
+# lists of objects. Freed slots are zeroed and reused; serial numbers keep
+# spawn order wherever order matters (snapshots, hit processing).
+KIND_FREE = 0
+KIND_OBSTACLE = 1
+KIND_POWER_UP = 2
+KIND_PARTICLE = 3
+KIND_COUNT = 4
+
+MOTION_NONE = 0
+MOTION_OSCILLATE = 1  # x = origin + sin(phase) * amplitude
+MOTION_SPIN = 2  # x = origin + cos(phase) * amplitude
+
+COLLIDER_NONE = 0
+COLLIDER_BOX = 1
+COLLIDER_SPIN_BAR = 2
+COLLIDER_PICKUP = 3
+
+PARTICLE_GRAVITY = 9.8
+POWER_UP_RADIUS = 0.5
+
+# (name, dtype, row shape) per column, grouped by component
+COLUMNS = (
+    # Identity
+    ("kind", np.uint8, ()),
+    ("serial", np.int64, ()),
+    # Transform
+    ("position", np.float64, (3,)),
+    # Kinematics
+    ("velocity", np.float64, (3,)),
+    ("gravity", np.float64, ()),
+    ("motion", np.uint8, ()),
+    ("origin_x", np.float64, ()),
+    ("amplitude", np.float64, ()),
+    ("rate", np.float64, ()),
+    ("phase", np.float64, ()),
+    # Collider
+    ("collider", np.uint8, ()),
+    ("size", np.float64, (3,)),
+    ("radius", np.float64, ()),
+    # Lifetime
+    ("life", np.float64, ()),
+    ("max_life", np.float64, ()),  # 0 for entities that only expire once passed
+    # Render
+    ("color", np.uint8, (4,)),
+    ("scale", np.float64, ()),
+    ("rotation", np.float64, ()),
+    ("hover", np.float64, ()),
+    ("type", np.int16, ()),  # Power-up table index
+)
+
+class EntityStore:
+    def __init__(self, capacity=128):
+        self.capacity = 0
+        for name, dtype, shape in COLUMNS:
+            setattr(self, name, np.zeros((0,) + shape, dtype=dtype))
+        self.free = []
+        self.counts = [0] * KIND_COUNT
+        self.next_serial = 0
+        self.time = 0.0  # Shared clock for the power-up hover
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        old = self.capacity
+        for name, dtype, shape in COLUMNS:
+            column = np.zeros((capacity,) + shape, dtype=dtype)
+            column[:old] = getattr(self, name)
+            setattr(self, name, column)
+        # Hand out low slots first so live entities stay packed together
+        self.free.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def spawn(self, kind):
+        if not self.free:
+            self.grow(self.capacity * 2)
+        slot = self.free.pop()
+        self.kind[slot] = kind
+        self.serial[slot] = self.next_serial
+        self.next_serial += 1
+        self.counts[kind] += 1
+        return slot
+
+    def spawn_obstacle(self, x, y, z, width, height, depth, color,
+                       motion=MOTION_NONE, origin_x=0.0, amplitude=0.0, rate=0.0, phase=0.0):
+        slot = self.spawn(KIND_OBSTACLE)
+        self.position[slot] = (x, y, z)
+        self.size[slot] = (width, height, depth)
+        self.color[slot] = color
+        self.motion[slot] = motion
+        self.origin_x[slot] = origin_x
+        self.amplitude[slot] = amplitude
+        self.rate[slot] = rate
+        self.phase[slot] = phase
+        self.collider[slot] = COLLIDER_SPIN_BAR if motion == MOTION_SPIN else COLLIDER_BOX
+        return slot
+
+    def spawn_power_up(self, x, y, z, type, color, rotation=0.0, hover=0.0):
+        slot = self.spawn(KIND_POWER_UP)
+        self.position[slot] = (x, y, z)
+        self.type[slot] = type
+        self.color[slot] = color
+        self.rotation[slot] = rotation
+        self.hover[slot] = hover
+        self.collider[slot] = COLLIDER_PICKUP
+        self.radius[slot] = POWER_UP_RADIUS
+        return slot
+
+    def spawn_particle(self, x, y, z, vx, vy, vz, color, life_time, size=0.2, max_life=None):
+        slot = self.spawn(KIND_PARTICLE)
+        self.position[slot] = (x, y, z)
+        self.velocity[slot] = (vx, vy, vz)
+        self.gravity[slot] = PARTICLE_GRAVITY
+        self.color[slot] = color
+        self.life[slot] = life_time
+        self.max_life[slot] = life_time if max_life is None else max_life
+        self.scale[slot] = size
+        return slot
+
+    def destroy(self, slots):
+        # Accepts one slot or an array of them
+        slots = np.atleast_1d(slots)
+        if not len(slots):
+            return
+        kinds = np.bincount(self.kind[slots], minlength=KIND_COUNT)
+        for kind in range(1, KIND_COUNT):
+            self.counts[kind] -= int(kinds[kind])
+        for name, _, _ in COLUMNS:
+            getattr(self, name)[slots] = 0
+        self.free.extend(sorted(slots.tolist(), reverse=True))
+
+    def slots(self, kind, since=0):
+        # Live slots of one kind spawned at or after serial `since`, in spawn order
+        mask = self.kind == kind
+        if since:
+            mask &= self.serial >= since
+        slots = np.flatnonzero(mask)
+        return slots[np.argsort(self.serial[slots], kind="stable")]
+
+    def count(self, kind):
+        return self.counts[kind]
+
+    def clear(self):
+        self.destroy(np.flatnonzero(self.kind != KIND_FREE))
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.next_serial = 0
+        self.time = 0.0
+
+    def shapes(self, slots):
+        # Plain (x, y, z, width, height, depth, motion, origin_x, amplitude)
+        # rows, for code that looks at a handful of obstacles at a time
+        return list(zip(
+            *self.position[slots].T.tolist(), *self.size[slots].T.tolist(),
+            self.motion[slots].tolist(), self.origin_x[slots].tolist(),
+            self.amplitude[slots].tolist()
+        ))
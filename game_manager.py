@@ -1,224 +1,229 @@
 from enum import Enum
 from pyray import *
-from levels import create_levels, Obstacle, PowerUp
-import math
-from random import randint
-
-# Window settings
-SCREEN_WIDTH = 1280
-SCREEN_HEIGHT = 720
+from levels import Level, ROW_LOOK_AHEAD
+from power_ups import POWER_UP_NAMES
+from quality import QUALITY_TIERS
+from scheduler import Scheduler
+from systems import (
+    SystemScheduler, spawn_system, stream_system, movement_system, magnet_system,
+    collision_system, pickup_system, lifetime_system, render_system, leading_ball,
+    PASSED_DISTANCE
+)
+
+# The next level is built a few fixed steps per tick over the last stretch
+# of the current one, so switching to it is only a reference swap. The
+# steps are counted rather than timed: building draws from the run's RNG
+# and has to happen on the same ticks when a replay is resimulated.
+# Building starts before the end of the level comes into view at any
+# quality tier (the tier follows frame times, so it cannot decide when
+# building starts), with room for the few ticks the road takes to build.
+PREPARE_DISTANCE = max(max(tier.draw_distance, tier.road_look_ahead)
+                       for tier in QUALITY_TIERS) + 100.0
+PREPARE_AHEAD = ROW_LOOK_AHEAD  # Rows the next level has ready when it takes over
+BUILD_STEPS_PER_TICK = 2
 
 class GameState(Enum):
     PLAYING = 1
     GAME_OVER = 2
     LEVEL_COMPLETE = 3
 
-from dataclasses import dataclass
-
-@dataclass
-class Vector3:
-    x: float
-    y: float
-    z: float
+class Achievement:
+    def __init__(self, name, description, condition_fn):
+        self.name = name
+        self.description = description
+        self.condition_fn = condition_fn
+        self.unlocked = False
+        self.show_timer = None  # Set while the unlock banner is shown
 
 class GameManager:
-    def __init__(self, levels):
-        self.levels = levels
+    def __init__(self, library, scheduler=None):
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.library = library  # PatternLibrary with the level definitions
+        self.level_settings = {}  # Applied to every level as it is created
         self.current_level = 0
+        self.current_level_data = self.create_level(0, 0.0)
+        self.current_level_data.build()
+        self.previous_level_data = None  # Kept until every ball is well past it
+        self.next_level_data = None  # Being built while the current one ends
         self.state = GameState.PLAYING
-        self.current_level_data = self.levels[self.current_level]
-        self.distance_traveled = 0
+        self.run_time = 0.0  # Simulated seconds of play in this run
         self.high_score = 0
-        self.chunk_size = 100  # Length of each repeating chunk
-        self.active_chunks = []  # List of active level chunks
-        self.last_chunk_z = 0  # Z position of the last generated chunk
-        self.ball_position = Vector3(0.0, 1.0, 0.0)
-
-    def update(self, ball, delta_time):
-        if self.state == GameState.PLAYING:
-            # Update level elements
-            self.current_level_data.update(delta_time, ball.position)
-            
-            # Update distance traveled (negative because we move in negative Z)
-            self.distance_traveled = -ball.position.z
-            
-            # Generate new chunks as needed
-            while -ball.position.z + 100 > self.last_chunk_z:  # Keep 100 units ahead
-                self.generate_new_chunk(ball)
-
-            # Check collisions with obstacles
-            for obstacle in self.current_level_data.obstacles:
-                if self.check_collision_with_obstacle(ball, obstacle):
-                    self.state = GameState.GAME_OVER
-                    if ball.score > self.high_score:
-                        self.high_score = ball.score
-                    return
-
-            # Check collisions with power-ups
-            for power_up in self.current_level_data.power_ups:
-                if power_up.active and self.check_collision_with_power_up(ball, power_up):
-                    power_up.active = False
-                    if power_up.type == "speed_boost":
-                        ball.has_speed_boost = True
-                        ball.speed_boost_timer = 5.0
-                        ball.score += 10
-
-        elif self.state == GameState.GAME_OVER:
-            if is_key_pressed(KEY_R):
-                self.reset_game(ball)
-
-    def generate_new_chunk(self, ball):
-        # Create a new chunk of obstacles and power-ups
-        chunk_z = self.last_chunk_z + self.chunk_size
-        
-        # Add obstacles
-        new_obstacles = []
-        
-        # Add random obstacle patterns
-        pattern = randint(0, 3)
-        
-        if pattern == 0:
-            # Slalom pattern
-            slalom_x = 3.0
-            for z in range(int(chunk_z), int(chunk_z + self.chunk_size), 15):
-                new_obstacles.append(
-                    Obstacle(
-                        Vector3(slalom_x, 1.0, float(z)),
-                        Vector3(2.0, 2.0, 2.0),
-                        DARKBROWN
-                    )
-                )
-                slalom_x *= -1
-        elif pattern == 1:
-            # Moving gate pattern
-            gate_spacing = self.chunk_size / 3
-            for i in range(3):
-                z_pos = chunk_z + i * gate_spacing
-                new_obstacles.append(
-                    Obstacle(
-                        Vector3(0.0, 1.0, z_pos),
-                        Vector3(6.0, 2.0, 2.0),
-                        MAROON,
-                        moving=True,
-                        move_range=3.0,
-                        move_speed=2.0 + i * 0.5
-                    )
-                )
-        elif pattern == 2:
-            # Zigzag pattern
-            for i in range(4):
-                z_pos = chunk_z + i * (self.chunk_size/4)
-                x_pos = 4.0 if i % 2 == 0 else -4.0
-                new_obstacles.append(
-                    Obstacle(
-                        Vector3(x_pos, 1.0, z_pos),
-                        Vector3(2.0, 2.0, 2.0),
-                        PURPLE
-                    )
-                )
-        else:
-            # Narrow passage pattern
-            z_pos = chunk_z + self.chunk_size/2
-            new_obstacles.append(
-                Obstacle(
-                    Vector3(-4.0, 1.0, z_pos),
-                    Vector3(2.0, 2.0, 8.0),
-                    DARKBLUE
-                )
-            )
-            new_obstacles.append(
-                Obstacle(
-                    Vector3(4.0, 1.0, z_pos),
-                    Vector3(2.0, 2.0, 8.0),
-                    DARKBLUE
-                )
+        self.telemetry = None
+        self.scores = None
+
+        # Systems in tick order; F3 shows how long each one takes
+        self.systems = SystemScheduler([
+            ("spawn", spawn_system),
+            ("stream", stream_system),
+            ("movement", movement_system),
+            ("magnet", magnet_system),
+            ("collision", collision_system),
+            ("pickup", pickup_system),
+            ("lifetime", lifetime_system),
+        ])
+
+        # Achievement system
+        self.achievements = [
+            Achievement(
+                "Speed Demon",
+                "Collect 3 speed boosts in a row",
+                lambda ball: ball.speed_boost_count >= 3
+            ),
+            Achievement(
+                "Combo Master",
+                "Get a 3x combo multiplier",
+                lambda ball: self.current_level_data.combo_multiplier >= 3
+            ),
+            Achievement(
+                "Distance Runner",
+                "Travel 1000 meters",
+                lambda ball: abs(ball.position.z) >= 1000
+            ),
+            Achievement(
+                "Power Collector",
+                "Collect 20 power-ups in total",
+                lambda ball: ball.total_power_ups >= 20
+            ),
+            Achievement(
+                "Chain Master",
+                "Collect 5 power-ups in a row",
+                lambda ball: ball.consecutive_power_ups >= 5
             )
-        
-        # Add all new obstacles to the current level
-        self.current_level_data.obstacles.extend(new_obstacles)
-        
-        # Add power-ups between obstacles
-        power_up_z = chunk_z + randint(20, int(self.chunk_size - 20))
-        power_up_x = randint(-3, 3)
-        self.current_level_data.power_ups.append(
-            PowerUp(
-                Vector3(float(power_up_x), 1.0, power_up_z),
-                "speed_boost"
+        ]
+
+    @property
+    def levels(self):
+        # Live levels in track order
+        return tuple(level for level in (
+            self.previous_level_data, self.current_level_data, self.next_level_data
+        ) if level is not None)
+
+    def configure_levels(self, **settings):
+        # quality, animation, envelope, telemetry
+        self.level_settings.update(settings)
+        for level in self.levels:
+            for name, value in settings.items():
+                setattr(level, name, value)
+
+    def create_level(self, index, origin_z):
+        # An empty level; build() or build_step() fills it in
+        level = Level(self.library, index, origin_z)
+        level.scheduler = self.scheduler
+        for name, value in self.level_settings.items():
+            setattr(level, name, value)
+        return level
+
+    def running(self):
+        # Level complete only marks the stretch after a switch; play goes on
+        return self.state != GameState.GAME_OVER
+
+    def update(self, balls, delta_time):
+        # Every ball races through the same world; the run ends once all of
+        # them have crashed
+        if not self.running():
+            return
+        self.run_time += delta_time
+        self.systems.run(self, balls, delta_time)
+        racing = [ball for ball in balls if not ball.crashed]
+        if not racing:
+            self.end_run(balls)
+            return
+
+        # Check achievements
+        for achievement in self.achievements:
+            if not achievement.unlocked and any(achievement.condition_fn(ball) for ball in racing):
+                achievement.unlocked = True
+                self.show_achievement(achievement, 3.0)  # Show for 3 seconds
+                if self.telemetry is not None:
+                    self.telemetry.achievement(achievement.name)
+
+        # Update score with combo system
+        level = self.current_level_data
+        for ball in racing:
+            ball.score = int(-ball.position.z * level.score_multiplier * level.combo_multiplier)
+
+    def render_state(self, balls):
+        return self.systems.call("render", render_system, self, leading_ball(balls).position.z)
+
+    def stream_levels(self, leader, trailer):
+        z = leader.position.z
+        level = self.current_level_data
+        if self.state == GameState.LEVEL_COMPLETE and z <= level.obstacle_start_distance:
+            self.state = GameState.PLAYING
+        if self.previous_level_data is not None:
+            if trailer.position.z < self.previous_level_data.end_z - PASSED_DISTANCE:
+                self.previous_level_data = None
+
+        if self.next_level_data is None:
+            index = self.current_level + 1
+            if index < len(self.library.levels) and z <= level.end_z + PREPARE_DISTANCE:
+                self.next_level_data = self.create_level(index, level.end_z)
+                self.next_level_data.build_rows_to = level.end_z - PREPARE_AHEAD
+        if self.next_level_data is not None:
+            for _ in range(BUILD_STEPS_PER_TICK):
+                if self.next_level_data.build_step():
+                    break
+            if z <= level.end_z:
+                self.switch_level()
+
+    def switch_level(self):
+        old, new = self.current_level_data, self.next_level_data
+        new.build()  # Only does anything when the approach was very fast
+
+        # The combo carries over into the next level
+        new.combo_count = old.combo_count
+        new.combo_multiplier = old.combo_multiplier
+        new.set_combo_timer(self.scheduler.remaining(old.combo_timer))
+        old.set_combo_timer(0)
+
+        self.previous_level_data = old
+        self.current_level_data = new
+        self.next_level_data = None
+        self.current_level = new.index
+        self.state = GameState.LEVEL_COMPLETE
+
+    def hit_obstacle(self, ball, slot):
+        if not self.running():
+            return
+        if ball.has_shield:
+            ball.set_power_up_timer("shield", 0)  # Remove shield on hit
+            self.current_level_data.add_particle_effect(ball.position, "collect")
+            return
+        ball.crashed = True
+        if ball.score > self.high_score:
+            self.high_score = ball.score
+        if self.telemetry is not None:
+            self.telemetry.death(ball.score, ball.position.x, ball.position.z)
+        if self.scores is not None:
+            self.scores.record_run(
+                ball.name, ball.score, -ball.position.z,
+                ball.total_power_ups,
+                sum(1 for a in self.achievements if a.unlocked)
             )
+
+    def end_run(self, balls):
+        self.state = GameState.GAME_OVER
+        if self.telemetry is not None:
+            best = max(balls, key=lambda ball: ball.score)
+            self.telemetry.run_ended(best.score, -leading_ball(balls).position.z)
+
+    def collect_power_up(self, ball, store, slot):
+        level = self.current_level_data
+        x, y, z = store.position[slot].tolist()
+        type = POWER_UP_NAMES[store.type[slot]]
+        store.destroy(slot)
+        ball.apply_power_up(type)
+        if self.telemetry is not None:
+            self.telemetry.pickup(type, x, z)
+        position = Vector3(x, y, z)
+        level.add_particle_effect(position)
+        level.add_combo(position)
+
+    def show_achievement(self, achievement, seconds):
+        self.scheduler.cancel(achievement.show_timer)
+        achievement.show_timer = self.scheduler.schedule(
+            seconds, self.hide_achievement, achievement
         )
-        
-        # Update the last chunk position
-        self.last_chunk_z = chunk_z
-        
-        # Clean up old obstacles and power-ups
-        self.cleanup_old_elements(ball)
-
-    def cleanup_old_elements(self, ball):
-        # Remove obstacles that are far behind the ball
-        self.current_level_data.obstacles = [
-            obs for obs in self.current_level_data.obstacles
-            if obs.position.z > ball.position.z - 50
-        ]
-        
-        # Remove inactive or far power-ups
-        self.current_level_data.power_ups = [
-            pow for pow in self.current_level_data.power_ups
-            if pow.active and pow.position.z > ball.position.z - 50
-        ]
 
-    def draw_level(self):
-        self.current_level_data.draw(self.ball_position)
-
-    def draw_ui(self):
-        # Draw score and distance
-        draw_text(f"Distance: {int(self.distance_traveled)}m", 10, 10, 20, WHITE)
-        draw_text(f"High Score: {self.high_score}m", 10, 40, 20, WHITE)
-        
-        # Draw speed boost timer if active
-        if self.state == GameState.PLAYING:
-            draw_text("Use LEFT/RIGHT to move, SPACE to jump", 
-                     SCREEN_WIDTH//2 - 150, SCREEN_HEIGHT - 30, 20, WHITE)
-
-        # Draw game over screen
-        if self.state == GameState.GAME_OVER:
-            text = "Game Over! Press R to restart"
-            font_size = 40
-            text_width = measure_text(text, font_size)
-            draw_text(text, SCREEN_WIDTH//2 - text_width//2, 
-                     SCREEN_HEIGHT//2 - font_size//2, font_size, RED)
-
-    def check_collision_with_obstacle(self, ball, obstacle):
-        # Simple AABB-Sphere collision
-        closest_x = max(obstacle.position.x - obstacle.size.x/2, 
-                       min(ball.position.x, obstacle.position.x + obstacle.size.x/2))
-        closest_y = max(obstacle.position.y - obstacle.size.y/2, 
-                       min(ball.position.y, obstacle.position.y + obstacle.size.y/2))
-        closest_z = max(obstacle.position.z - obstacle.size.z/2, 
-                       min(ball.position.z, obstacle.position.z + obstacle.size.z/2))
-        
-        distance = ((closest_x - ball.position.x) ** 2 + 
-                   (closest_y - ball.position.y) ** 2 + 
-                   (closest_z - ball.position.z) ** 2) ** 0.5
-        
-        return distance < ball.radius
-
-    def check_collision_with_power_up(self, ball, power_up):
-        distance = ((ball.position.x - power_up.position.x) ** 2 +
-                   (ball.position.y - power_up.position.y) ** 2 +
-                   (ball.position.z - power_up.position.z) ** 2) ** 0.5
-        return distance < (ball.radius + power_up.radius)
-
-    def reset_game(self, ball):
-        self.current_level = 0
-        self.current_level_data = self.levels[self.current_level]
-        self.state = GameState.PLAYING
-        ball.position = Vector3(0.0, 1.0, 0.0)
-        ball.velocity = Vector3(0.0, 0.0, 0.0)
-        ball.score = 0
-        ball.has_speed_boost = False
-        ball.speed_boost_timer = 0
-        self.distance_traveled = 0
-        self.last_chunk_z = 0
-        # Reset power-ups
-        for power_up in self.current_level_data.power_ups:
-            power_up.active = True
+    def hide_achievement(self, achievement):
+        achievement.show_timer = None
@@ -0,0 +1,122 @@
+from collections import deque
+import gc
+import time
+
+# Cyclic GC instrumentation and frame-budgeted collection.
+#
+# GCMonitor hooks gc.callbacks and records every collection (generation,
+# pause, objects collected) against the frame it landed in.
+#
+# FrameCollector is the managed mode: everything alive after startup is
+# frozen into the permanent generation, automatic collection is switched
+# off and the game collects explicitly at the end of frames that finished
+# with enough spare budget for the expected pause. A frame cap still forces
+# a young collection so garbage cannot pile up while the game runs hot.
+class GCMonitor:
+    def __init__(self, history=600):
+        self.frame = 0
+        self.pauses = deque(maxlen=history)  # (frame, generation, pause ms, collected)
+        self.frame_pause_ms = 0.0  # Total pause in the current frame
+        self.count = 0
+        self.worst = None
+        self.telemetry = None
+        # Running average pause per generation, used to plan collections
+        self.expected_ms = [0.1, 0.5, 5.0]
+        self.started = 0.0
+        gc.callbacks.append(self.on_gc)
+
+    def begin_frame(self, frame_number):
+        self.frame = frame_number
+        self.frame_pause_ms = 0.0
+
+    def on_gc(self, phase, info):
+        if phase == "start":
+            self.started = time.perf_counter()
+            return
+        pause_ms = (time.perf_counter() - self.started) * 1000.0
+        generation = info["generation"]
+        record = (self.frame, generation, pause_ms, info["collected"])
+        self.pauses.append(record)
+        self.frame_pause_ms += pause_ms
+        self.count += 1
+        if self.worst is None or pause_ms > self.worst[2]:
+            self.worst = record
+        self.expected_ms[generation] += (pause_ms - self.expected_ms[generation]) * 0.2
+        if self.telemetry is not None:
+            self.telemetry.gc_pause(*record)
+
+    def report(self):
+        if self.worst is None:
+            return []
+        frame, generation, pause_ms, _ = self.worst
+        recent = [record[2] for record in self.pauses]
+        return [
+            f"GC: {self.count} pauses, recent mean {sum(recent) / len(recent):.2f} ms",
+            f"GC worst: {pause_ms:.2f} ms (gen {generation}, frame {frame})",
+        ]
+
+    def close(self):
+        gc.callbacks.remove(self.on_gc)
+
+class FrameCollector:
+    def __init__(self, monitor, max_frames=(120, 1200, 36000), margin_ms=1.0):
+        self.monitor = monitor
+        self.max_frames = max_frames  # Forced collection cap per generation
+        self.margin_ms = margin_ms
+        self.frames_since = [0, 0, 0]
+        self.enabled = False
+        self.forced = 0
+
+    def enable(self):
+        # Collect once, then move every startup object out of the GC's reach
+        if self.enabled:
+            return
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        self.frames_since = [0, 0, 0]
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        gc.unfreeze()
+        gc.enable()
+        self.enabled = False
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def end_frame(self, work_ms, budget_ms):
+        # Call after the frame's work is measured and before end_drawing
+        if not self.enabled:
+            return
+        frames_since = self.frames_since
+        for generation in range(3):
+            frames_since[generation] += 1
+        spare_ms = budget_ms - work_ms - self.margin_ms
+        threshold0, threshold1, _ = gc.get_threshold()
+        counts = gc.get_count()
+
+        # Oldest generation that is due, either by allocation count or cap
+        for generation in (2, 1, 0):
+            forced = frames_since[generation] >= self.max_frames[generation]
+            if generation == 2:
+                due = forced
+            elif generation == 1:
+                due = counts[1] >= threshold1 or forced
+            else:
+                due = counts[0] >= threshold0 or forced
+            if not due:
+                continue
+            if spare_ms < self.monitor.expected_ms[generation] and not forced:
+                continue
+            gc.collect(generation)
+            for younger in range(generation + 1):
+                frames_since[younger] = 0
+            if forced:
+                self.forced += 1
+            return
@@ -0,0 +1,164 @@
+from pyray import *
+import heapq
+import numpy as np
+from encoding import POSITION_SCALE
+from replays import ReplayError
+
+# Draws hundreds of past runs as ghost balls next to the live one. Each
+# replay's fixed-width track is resampled once onto a shared time grid, so
+# advancing every ghost is a single vectorised lerp, and the ghosts plus
+# their trails are drawn with one instanced call per trail step.
+TRACK_DTYPE = np.dtype([("time", "<f4"), ("x", "<i4"), ("y", "<i4"), ("z", "<i4")])
+GRID_STEP = 0.1  # Seconds between resampled positions
+
+# Shared trail scheme: (z offset, scale, alpha) for every ghost
+GHOST_TRAIL = [
+    (0.0, 1.0, 0.45),
+    (0.6, 0.8, 0.25),
+    (1.2, 0.6, 0.12),
+]
+
+INSTANCED_VS = """
+#version 330
+in vec3 vertexPosition;
+in mat4 instanceTransform;
+
+uniform mat4 mvp;
+
+void main()
+{
+    gl_Position = mvp * instanceTransform * vec4(vertexPosition, 1.0);
+}
+"""
+
+INSTANCED_FS = """
+#version 330
+uniform vec4 colDiffuse;
+out vec4 finalColor;
+
+void main()
+{
+    finalColor = colDiffuse;
+}
+"""
+
+class GhostLayer:
+    def __init__(self, max_ghosts=500, radius=0.5, color=WHITE):
+        self.max_ghosts = max_ghosts
+        self.radius = radius
+        self.color = color
+        self.count = 0
+        self.elapsed = 0.0
+        self.grid = np.zeros((0, 2, 3), dtype=np.float32)
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+
+        self.shader = load_shader_from_memory(INSTANCED_VS, INSTANCED_FS)
+        self.instanced = is_shader_ready(self.shader)
+        if self.instanced:
+            self.shader.locs[SHADER_LOC_MATRIX_MVP] = get_shader_location(self.shader, "mvp")
+            self.shader.locs[SHADER_LOC_MATRIX_MODEL] = get_shader_location_attrib(
+                self.shader, "instanceTransform"
+            )
+            self.mesh = gen_mesh_sphere(radius, 8, 8)
+            self.material = load_material_default()
+            self.material.shader = self.shader
+        self.transforms = []
+
+    def load(self, archive):
+        # Pick the best runs straight from the archive index
+        scores = []
+        for index in range(len(archive)):
+            try:
+                scores.append((archive.entry(index)[6], index))
+            except ReplayError:
+                continue
+        best = [index for _, index in heapq.nlargest(self.max_ghosts, scores)]
+        tracks = []
+        for index in best:
+            try:
+                replay = archive.replay(index)
+            except ReplayError:
+                continue
+            if replay.track_count < 2:
+                continue
+            tracks.append(np.frombuffer(replay.track_bytes(), dtype=TRACK_DTYPE))
+
+        self.count = len(tracks)
+        if not tracks:
+            self.grid = np.zeros((0, 2, 3), dtype=np.float32)
+            self.lengths = np.zeros(0, dtype=np.int32)
+            self.positions = np.zeros((0, 3), dtype=np.float32)
+            self.transforms = []
+            return
+
+        # Resample every track onto the same time grid: grid[ghost, step, axis]
+        steps = int(max(float(track["time"][-1]) for track in tracks) / GRID_STEP) + 2
+        grid_times = np.arange(steps, dtype=np.float32) * GRID_STEP
+        self.grid = np.empty((self.count, steps, 3), dtype=np.float32)
+        self.lengths = np.empty(self.count, dtype=np.int32)
+        for ghost, track in enumerate(tracks):
+            times = track["time"]
+            for axis, name in enumerate(("x", "y", "z")):
+                self.grid[ghost, :, axis] = np.interp(
+                    grid_times, times, track[name] / POSITION_SCALE
+                )
+            self.lengths[ghost] = int(times[-1] / GRID_STEP) + 1
+        self.positions = np.empty((self.count, 3), dtype=np.float32)
+
+        # One preallocated transform buffer per trail step; only the
+        # translation column changes from frame to frame
+        self.transforms = []
+        for _, scale, _ in GHOST_TRAIL:
+            matrices = np.zeros((self.count, 16), dtype=np.float32)
+            matrices[:, 0] = scale
+            matrices[:, 5] = scale
+            matrices[:, 10] = scale
+            matrices[:, 15] = 1.0
+            self.transforms.append((matrices, ffi.from_buffer("Matrix[]", matrices)))
+        self.reset()
+
+    def reset(self):
+        self.seek(0.0)
+
+    def seek(self, run_time):
+        # Ghosts sit where their runs were after the same simulated time as
+        # the live run, so they follow the fixed ticks, not frame times
+        self.elapsed = run_time
+        if not self.count:
+            return
+        position = self.elapsed / GRID_STEP
+        step = int(position)
+        alpha = position - step
+        last = self.grid.shape[1] - 1
+        a = self.grid[:, min(step, last)]
+        b = self.grid[:, min(step + 1, last)]
+        np.multiply(b - a, alpha, out=self.positions)
+        self.positions += a
+        # Finished ghosts stay where their run ended
+        finished = step >= self.lengths
+        if finished.any():
+            self.positions[finished] = self.grid[finished, self.lengths[finished] - 1]
+
+    def draw(self):
+        if not self.count:
+            return
+        if not self.instanced:
+            for x, y, z in self.positions:
+                draw_sphere((float(x), float(y), float(z)), self.radius,
+                            fade(self.color, GHOST_TRAIL[0][2]))
+            return
+
+        # Meshes bypass the immediate-mode batch; flush it to keep draw order
+        rl_draw_render_batch_active()
+        for (offset, _, alpha), (matrices, buffer) in zip(GHOST_TRAIL, self.transforms):
+            matrices[:, 3] = self.positions[:, 0]
+            matrices[:, 7] = self.positions[:, 1]
+            matrices[:, 11] = self.positions[:, 2] + offset
+            self.material.maps[MATERIAL_MAP_DIFFUSE].color = fade(self.color, alpha)
+            draw_mesh_instanced(self.mesh, self.material, buffer, self.count)
+
+    def unload(self):
+        if self.instanced:
+            unload_mesh(self.mesh)
+        unload_shader(self.shader)
@@ -0,0 +1,391 @@
+import argparse
+import asyncio
+import struct
+import threading
+import time
+from encoding import quantise_state, dequantise_state, write_varint, read_varint
+
+# Live ghost racing. Clients send their ball state to the server, which
+# groups them into race rooms and broadcasts quantised, delta-compressed
+# snapshots of every ball in the room at a fixed tick rate.
+#
+# Every message is framed as u16 length + payload; the first payload byte
+# is the message type.
+DEFAULT_PORT = 47800
+DEFAULT_TICK_RATE = 20
+ROOM_SIZE = 8
+
+MSG_HELLO = 1       # client -> server: room and player name
+MSG_STATE = 2       # client -> server: quantised position and velocity
+MSG_WELCOME = 3     # server -> client: session id and tick rate
+MSG_SNAPSHOT = 4    # server -> client: keyframe or delta of the room
+
+FRAME = struct.Struct("<H")
+STATE = struct.Struct("<B3i3h")
+WELCOME = struct.Struct("<BHH")
+SNAPSHOT = struct.Struct("<BBIH")
+
+FLAG_KEYFRAME = 1
+REMOVED_BIT = 0x40
+FIELD_COUNT = 6
+
+# Bounds on what a single connection may hold in memory
+MAX_INBOUND_BYTES = 4096
+MAX_OUTBOUND_BYTES = 64 * 1024
+
+def encode_snapshot(tick, current, baseline=None):
+    # With no baseline every field of every ball is sent (a keyframe),
+    # otherwise only fields that changed since the baseline
+    out = bytearray(FRAME.size + SNAPSHOT.size)
+    count = 0
+    for session_id, state in current.items():
+        previous = baseline.get(session_id) if baseline is not None else None
+        mask = 0
+        for field in range(FIELD_COUNT):
+            if previous is None or state[field] != previous[field]:
+                mask |= 1 << field
+        if not mask:
+            continue
+        out += struct.pack("<HB", session_id, mask)
+        for field in range(FIELD_COUNT):
+            if mask & (1 << field):
+                base = previous[field] if previous is not None else 0
+                write_varint(out, state[field] - base)
+        count += 1
+    if baseline is not None:
+        for session_id in baseline:
+            if session_id not in current:
+                out += struct.pack("<HB", session_id, REMOVED_BIT)
+                count += 1
+    if baseline is not None and count == 0:
+        return None
+    FRAME.pack_into(out, 0, len(out) - FRAME.size)
+    SNAPSHOT.pack_into(out, FRAME.size, MSG_SNAPSHOT,
+                       FLAG_KEYFRAME if baseline is None else 0, tick, count)
+    return bytes(out)
+
+def apply_snapshot(payload, states):
+    # Updates states (session id -> quantised state list) in place
+    _, flags, tick, count = SNAPSHOT.unpack_from(payload, 0)
+    offset = SNAPSHOT.size
+    if flags & FLAG_KEYFRAME:
+        states.clear()
+    for _ in range(count):
+        session_id, mask = struct.unpack_from("<HB", payload, offset)
+        offset += 3
+        if mask & REMOVED_BIT:
+            states.pop(session_id, None)
+            continue
+        state = states.get(session_id)
+        if state is None:
+            state = states[session_id] = [0] * FIELD_COUNT
+        for field in range(FIELD_COUNT):
+            if mask & (1 << field):
+                delta, offset = read_varint(payload, offset)
+                state[field] += delta
+    return tick
+
+def frame_message(payload):
+    return FRAME.pack(len(payload)) + payload
+
+class Session:
+    def __init__(self, session_id, transport):
+        self.id = session_id
+        self.transport = transport
+        self.room = None
+        self.name = ""
+        self.state = None
+        self.needs_keyframe = True
+        self.dropped = 0
+
+class Room:
+    def __init__(self, name):
+        self.name = name
+        self.sessions = {}
+        self.baseline = {}
+
+    def broadcast(self, tick):
+        current = {s.id: s.state for s in self.sessions.values() if s.state is not None}
+        delta = encode_snapshot(tick, current, self.baseline)
+        keyframe = None
+        for session in self.sessions.values():
+            transport = session.transport
+            if transport.get_write_buffer_size() > MAX_OUTBOUND_BYTES:
+                # Slow reader: skip it this tick and resync with a keyframe
+                session.needs_keyframe = True
+                session.dropped += 1
+                continue
+            if session.needs_keyframe:
+                if keyframe is None:
+                    keyframe = encode_snapshot(tick, current)
+                transport.write(keyframe)
+                session.needs_keyframe = False
+            elif delta is not None:
+                transport.write(delta)
+        self.baseline = current
+
+class GhostRaceServer:
+    def __init__(self, tick_rate=DEFAULT_TICK_RATE, room_size=ROOM_SIZE):
+        self.tick_rate = tick_rate
+        self.room_size = room_size
+        self.sessions = {}
+        self.rooms = {}
+        self.free_ids = []
+        self.next_id = 1
+        self.tick = 0
+        self.tick_time_ms = 0.0
+        self.server = None
+        self.tick_task = None
+
+    def allocate_id(self):
+        if self.free_ids:
+            return self.free_ids.pop()
+        session_id = self.next_id
+        self.next_id += 1
+        return session_id
+
+    def join(self, session, room_name):
+        # Full rooms spill over into numbered overflow rooms
+        index = 0
+        name = room_name
+        while name in self.rooms and len(self.rooms[name].sessions) >= self.room_size:
+            index += 1
+            name = f"{room_name}#{index}"
+        room = self.rooms.get(name)
+        if room is None:
+            room = self.rooms[name] = Room(name)
+        room.sessions[session.id] = session
+        session.room = room
+
+    def leave(self, session):
+        room = session.room
+        if room is not None:
+            room.sessions.pop(session.id, None)
+            if not room.sessions:
+                del self.rooms[room.name]
+        if self.sessions.pop(session.id, None) is not None:
+            self.free_ids.append(session.id)
+
+    def handle_message(self, session, payload):
+        # False when the payload is malformed; the connection is then dropped
+        kind = payload[0]
+        if kind == MSG_STATE and session.room is not None:
+            if len(payload) != STATE.size:
+                return False
+            session.state = STATE.unpack(payload)[1:]
+        elif kind == MSG_HELLO and session.room is None:
+            # u8 type, u8 room length, room, u8 name length, name
+            if len(payload) < 2:
+                return False
+            room_length = payload[1]
+            start = 2 + room_length
+            if len(payload) < start + 1:
+                return False
+            name_length = payload[start]
+            if len(payload) != start + 1 + name_length:
+                return False
+            room_name = bytes(payload[2:start]).decode("utf-8", "replace")
+            session.name = bytes(payload[start + 1:]).decode("utf-8", "replace")
+            self.join(session, room_name or "default")
+            session.transport.write(frame_message(
+                WELCOME.pack(MSG_WELCOME, session.id, self.tick_rate)
+            ))
+        return True
+
+    async def run_ticks(self):
+        interval = 1.0 / self.tick_rate
+        next_tick = time.perf_counter()
+        while True:
+            start = time.perf_counter()
+            self.tick += 1
+            for room in list(self.rooms.values()):
+                room.broadcast(self.tick)
+            self.tick_time_ms = (time.perf_counter() - start) * 1000.0
+            # Fixed-rate schedule that doesn't drift with tick cost
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(
+            lambda: GhostServerProtocol(self), host, port
+        )
+        self.tick_task = asyncio.create_task(self.run_ticks())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.tick_task.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+class MessageProtocol(asyncio.Protocol):
+    # Splits the byte stream into length-prefixed messages
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = bytearray()
+
+    def data_received(self, data):
+        buffer = self.buffer
+        buffer += data
+        if len(buffer) > MAX_INBOUND_BYTES:
+            self.transport.close()
+            return
+        offset = 0
+        while len(buffer) - offset >= FRAME.size:
+            length = FRAME.unpack_from(buffer, offset)[0]
+            end = offset + FRAME.size + length
+            if end > len(buffer) or self.transport.is_closing():
+                break
+            if length:
+                self.message_received(bytes(buffer[offset + FRAME.size:end]))
+            offset = end
+        del buffer[:offset]
+
+    def message_received(self, payload):
+        pass
+
+class GhostServerProtocol(MessageProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.session = None
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        session_id = self.server.allocate_id()
+        self.session = Session(session_id, transport)
+        self.server.sessions[session_id] = self.session
+
+    def message_received(self, payload):
+        if not self.server.handle_message(self.session, payload):
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.server.leave(self.session)
+
+class GhostClientProtocol(MessageProtocol):
+    def __init__(self, client):
+        self.client = client
+
+    def message_received(self, payload):
+        self.client.message_received(payload)
+
+    def connection_lost(self, exc):
+        self.client.connected = False
+
+class GhostRaceClient:
+    # Runs its own event loop on a background thread; main() only calls
+    # send_state() and ghost_positions(), neither of which blocks
+    def __init__(self, host, port=DEFAULT_PORT, room="default", name="player",
+                 interpolation_delay=None):
+        self.host = host
+        self.port = port
+        self.room = room
+        self.name = name
+        self.session_id = None
+        self.tick_rate = DEFAULT_TICK_RATE
+        self.interpolation_delay = interpolation_delay
+        self.connected = False
+        self.latest_state = None
+        self.states = {}
+        # Published for the render thread: session id -> (previous, latest)
+        # samples of (receive time, dequantised state)
+        self.tracks = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run_loop, name="ghost-race", daemon=True)
+        self.thread.start()
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.run())
+        except OSError:
+            self.connected = False
+
+    async def run(self):
+        transport, _ = await self.loop.create_connection(
+            lambda: GhostClientProtocol(self), self.host, self.port
+        )
+        self.transport = transport
+        self.connected = True
+        room = self.room.encode("utf-8")[:255]
+        name = self.name.encode("utf-8")[:255]
+        transport.write(frame_message(
+            bytes((MSG_HELLO, len(room))) + room + bytes((len(name),)) + name
+        ))
+        # Send at the server tick rate; only the newest state matters
+        while self.connected:
+            state = self.latest_state
+            if state is not None and self.session_id is not None:
+                transport.write(frame_message(STATE.pack(MSG_STATE, *state)))
+            await asyncio.sleep(1.0 / self.tick_rate)
+        transport.close()
+
+    def message_received(self, payload):
+        kind = payload[0]
+        if kind == MSG_WELCOME:
+            _, self.session_id, self.tick_rate = WELCOME.unpack(payload)
+        elif kind == MSG_SNAPSHOT:
+            apply_snapshot(payload, self.states)
+            now = time.perf_counter()
+            tracks = {}
+            for session_id, state in self.states.items():
+                if session_id == self.session_id:
+                    continue
+                sample = (now, dequantise_state(state))
+                previous = self.tracks.get(session_id)
+                tracks[session_id] = (previous[1] if previous else sample, sample)
+            self.tracks = tracks
+
+    def send_state(self, position, velocity):
+        self.latest_state = quantise_state(position, velocity)
+
+    def ghost_positions(self):
+        # Interpolate between the last two snapshots, rendered one tick late
+        # so there is normally a newer sample to move towards
+        delay = self.interpolation_delay
+        if delay is None:
+            delay = 1.0 / self.tick_rate
+        render_time = time.perf_counter() - delay
+        positions = []
+        for previous, latest in self.tracks.values():
+            t0, a = previous
+            t1, b = latest
+            if t1 > t0:
+                alpha = min(1.0, max(0.0, (render_time - t0) / (t1 - t0)))
+            else:
+                alpha = 1.0
+            positions.append((
+                a[0] + (b[0] - a[0]) * alpha,
+                a[1] + (b[1] - a[1]) * alpha,
+                a[2] + (b[2] - a[2]) * alpha,
+            ))
+        return positions
+
+    def close(self):
+        self.connected = False
+        self.thread.join(timeout=1.0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ghost race server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--tick-rate", type=int, default=DEFAULT_TICK_RATE)
+    parser.add_argument("--room-size", type=int, default=ROOM_SIZE)
+    args = parser.parse_args()
+
+    async def serve():
+        server = GhostRaceServer(args.tick_rate, args.room_size)
+        port = await server.start(args.host, args.port)
+        print(f"Ghost race server listening on {args.host}:{port}")
+        while True:
+            await asyncio.sleep(5.0)
+            print(f"tick {server.tick}: {len(server.sessions)} sessions, "
+                  f"{len(server.rooms)} rooms, last tick {server.tick_time_ms:.2f} ms")
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+from pyray import *
+from collections import deque
+import time
+
+# Input-to-display latency instrument. raylib only reports key state at
+# each input poll, so a key press is timestamped halfway between the poll
+# that first saw it and the poll before (where a press landing anywhere in
+# between is expected to have happened). Each press is then stamped again
+# when the sim tick consumes it and when end_drawing presents the first
+# frame drawn from that tick. The sim may run on its own thread, so lists
+# shared between threads are swapped out whole rather than cleared.
+STAGES = ("event_to_tick", "tick_to_present", "event_to_present")
+
+class InputLatencyMonitor:
+    def __init__(self, keys, window=600):
+        self.keys = keys
+        self.last_poll = time.perf_counter()
+        self.pending = []  # Event times not yet consumed by a sim tick
+        self.in_flight = []  # (event time, tick time, tick) waiting to be presented
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES}
+
+    def polled(self):
+        # Call after every input poll (end_drawing's and any late poll)
+        now = time.perf_counter()
+        event_time = (self.last_poll + now) / 2.0
+        for key in self.keys:
+            if is_key_pressed(key):
+                self.pending.append(event_time)
+        self.last_poll = now
+
+    def consumed(self, tick):
+        # Call when the sim tick that reads the sampled input runs
+        now = time.perf_counter()
+        pending, self.pending = self.pending, []
+        for event_time in pending:
+            self.samples["event_to_tick"].append(now - event_time)
+            self.in_flight.append((event_time, now, tick))
+
+    def presented(self, tick):
+        # Call right after end_drawing with the tick the frame was drawn from
+        now = time.perf_counter()
+        in_flight, self.in_flight = self.in_flight, []
+        for entry in in_flight:
+            event_time, tick_time, consumed_tick = entry
+            if consumed_tick > tick:
+                self.in_flight.append(entry)  # Not on screen yet
+                continue
+            self.samples["tick_to_present"].append(now - tick_time)
+            self.samples["event_to_present"].append(now - event_time)
+
+    def discard(self):
+        # Drop presses made while nothing consumes input (menus, game over)
+        self.pending = []
+
+    def percentiles(self, stage, points=(50, 90, 99)):
+        # Milliseconds at each percentile, or None before any samples
+        values = sorted(self.samples[stage])
+        if not values:
+            return None
+        last = len(values) - 1
+        return tuple(values[min(last, int(last * point / 100.0 + 0.5))] * 1000.0
+                     for point in points)
+
+    def report(self):
+        lines = []
+        for stage in STAGES:
+            result = self.percentiles(stage)
+            if result is not None:
+                p50, p90, p99 = result
+                lines.append(f"{stage}: p50 {p50:.1f} ms  p90 {p90:.1f} ms  p99 {p99:.1f} ms")
+        return lines
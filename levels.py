@@ -1,257 +1,232 @@
 from pyray import *
-from random import choice, random, randint, uniform
+from random import Random, choice, random, randint, uniform
+from quality import QUALITY_TIERS
+from power_ups import POWER_UPS, POWER_UP_TYPES, POWER_UP_INDEX
+from entities import EntityStore, KIND_OBSTACLE, MOTION_NONE, MOTION_OSCILLATE, MOTION_SPIN
+from patterns import spawn_pattern, spawn_obstacles
+from render_queue import PASS_SHADED, PASS_TRANSLUCENT
+from bisect import bisect_left, bisect_right
+from collections import deque
+from operator import neg
 import math
 
-class Obstacle:
-    def __init__(self, position, size, color, moving=False, move_range=0.0, move_speed=0.0, spinning=False, spin_radius=0.0, spin_speed=0.0):
-        self.position = position
-        self.size = size
-        self.color = color
-        self.moving = moving
-        self.move_range = move_range
-        self.move_speed = move_speed
-        self.initial_x = position.x
-        self.time = 0
-        self.spinning = spinning
-        self.spin_radius = spin_radius
-        self.spin_speed = spin_speed
-        self.spin_angle = 0
+INITIAL_SEGMENTS = 40
+SEGMENTS_PER_STEP = 8
+TRANSITION_GAP = 100.0  # Room for the next level's starting obstacles
+# Particle effects draw from their own generator: how many particles an
+# effect spawns depends on the quality tier, which follows wall-clock frame
+# times, and must not shift the run's RNG that obstacle generation and
+# replays depend on
+EFFECTS_RANDOM = Random()
+ROW_LOOK_AHEAD = 400.0  # Obstacle rows exist this far ahead of the ball
+VIEW_BEHIND = 15.0  # The camera sits 10 behind the ball, so nothing past this shows
 
-    def update(self, delta_time):
-        if self.moving:
-            self.time += delta_time
-            self.position.x = self.initial_x + math.sin(self.time * self.move_speed) * self.move_range
-        if self.spinning:
-            self.spin_angle += self.spin_speed * delta_time
-            self.position.x = self.spin_radius * math.cos(self.spin_angle)
-
-    def draw(self):
-        draw_cube(
-            (self.position.x, self.position.y, self.position.z),
-            self.size.x, self.size.y, self.size.z,
-            self.color
-        )
-
-class PowerUp:
-    def __init__(self, position, type):
-        self.position = position
-        self.type = type
-        self.radius = 0.5
-        self.active = True
-        self.rotation = 0
-        self.hover_offset = 0
-        
-        # Set color based on power-up type
-        if type == "speed_boost":
-            self.color = GOLD
-        elif type == "shield":
-            self.color = SKYBLUE
-        elif type == "points":
-            self.color = GREEN
-        elif type == "magnet":
-            self.color = PURPLE
-
-    def update(self, delta_time):
-        if self.active:
-            self.rotation += 90.0 * delta_time
-            self.hover_offset = math.sin(get_time() * 4) * 0.3  # Faster and more pronounced hover
-
-    def draw(self):
-        if self.active:
-            # Draw power-up with glow effect
-            glow_size = 1.0 + abs(math.sin(get_time() * 3)) * 0.2
-            draw_cube(
-                (self.position.x, self.position.y + self.hover_offset, self.position.z),
-                0.8 * glow_size, 0.8 * glow_size, 0.8 * glow_size,
-                fade(self.color, 0.5)
-            )
-            # Inner cube
-            draw_cube(
-                (self.position.x, self.position.y + self.hover_offset, self.position.z),
-                0.5, 0.5, 0.5,
-                self.color
-            )
-
-class Particle:
-    def __init__(self, position, velocity, color, life_time, size=0.2):
-        self.position = position
-        self.velocity = velocity
-        self.color = color
-        self.life_time = life_time
-        self.max_life = life_time
-        self.size = size
-
-    def update(self, delta_time):
-        self.position.x += self.velocity.x * delta_time
-        self.position.y += self.velocity.y * delta_time
-        self.position.z += self.velocity.z * delta_time
-        self.life_time -= delta_time
-        
-        # Add gravity effect
-        self.velocity.y -= 9.8 * delta_time
-
-    def draw(self):
-        alpha = self.life_time / self.max_life
-        color = Color(
-            self.color[0],
-            self.color[1],
-            self.color[2],
-            int(255 * alpha)
-        )
-        draw_sphere(
-            (self.position.x, self.position.y, self.position.z),
-            self.size * alpha,
-            color
-        )
+# A level is built in bounded steps so the next one can be prepared a
+# little at a time while the current one is still being played
+BUILD_ROAD = 0
+BUILD_TEMPLATE = 1
+BUILD_ROWS = 2
+BUILD_DONE = 3
 
 class Level:
-    def __init__(self):
-        self.obstacles = []
-        self.power_ups = []
-        self.road_segments = []
-        self.particles = []
-        self.last_segment_z = 0
+    def __init__(self, patterns, index=0, origin_z=0.0):
+        # Obstacles, power-ups and particles live in the entity store; road
+        # segments are kept in spawn order so passed ones pop off the front
+        self.store = EntityStore()
+        self.road_segments = deque()
+        self.index = index  # Entry in data/levels.json
+        self.origin_z = origin_z  # Where the level begins
+        _, _, length, self.difficulty_bonus = patterns.levels[index]
+        self.end_z = origin_z - length if length > 0 else -math.inf
+        self.last_segment_z = origin_z
         self.segment_length = 20.0
         self.road_width = 10.0
-        self.next_obstacle_z = -50
-        self.obstacle_start_distance = -50
-        self.difficulty = 1.0
+        self.next_obstacle_z = origin_z - 50
+        self.obstacle_start_distance = origin_z - 50
+        self.difficulty = 1.0 + abs(origin_z) / 500.0 + self.difficulty_bonus
         self.score_multiplier = 1.0
         self.combo_multiplier = 1.0
-        self.combo_timer = 0
+        self.combo_timer = None  # Scheduler timer that ends the combo
         self.combo_count = 0
-        
-        # Generate initial road segments
-        for i in range(40):
-            self.generate_road_segment()
+        self.quality = QUALITY_TIERS[0]
+        self.animation = None  # GPU animation shader, set once a window exists
+        self.telemetry = None
+        self.scheduler = None  # Shared game scheduler, set by the game manager
+        self.envelope = None  # Ball movement envelope for solvability checks
+        self.feasible = None  # Lateral positions the ball can reach at feasible_z
+        self.feasible_z = origin_z
+        self.rejected_patterns = 0
+        self.patterns = patterns  # PatternLibrary the obstacle rows are drawn from
+        self.build_stage = BUILD_ROAD
+        self.build_rows_to = origin_z  # Rows generated ahead while building
+
+    def build_step(self):
+        # One bounded piece of construction; True once the level is complete
+        if self.build_stage == BUILD_ROAD:
+            for _ in range(SEGMENTS_PER_STEP):
+                if len(self.road_segments) >= INITIAL_SEGMENTS or not self.road_continues():
+                    self.build_stage = BUILD_TEMPLATE
+                    break
+                self.generate_road_segment()
+        elif self.build_stage == BUILD_TEMPLATE:
+            # Starting obstacles and power-ups from data/levels.json
+            obstacles, power_ups, _, _ = self.patterns.levels[self.index]
+            spawn_obstacles(self, obstacles, self.origin_z)
+            for x, y, z, type in power_ups:
+                self.spawn_power_up(x, y, self.origin_z + z, type)
+            self.build_stage = BUILD_ROWS
+        elif self.build_stage == BUILD_ROWS:
+            # The rows the spawn step would otherwise make on the first tick
+            if self.next_obstacle_z > self.build_rows_to and self.rows_continue():
+                self.generate_obstacle()
+            else:
+                self.build_stage = BUILD_DONE
+        elif self.build_stage != BUILD_DONE:
+            # Would otherwise never finish and hang build()
+            raise ValueError(f"Unknown build stage {self.build_stage}")
+        return self.build_stage == BUILD_DONE
+
+    def build(self):
+        while not self.build_step():
+            pass
+
+    def road_continues(self):
+        return self.last_segment_z > self.end_z
+
+    def rows_continue(self):
+        return self.next_obstacle_z > self.end_z + TRANSITION_GAP
 
     def update(self, delta_time, ball_position):
         # Update difficulty and multipliers
-        self.difficulty = 1.0 + abs(ball_position.z) / 500.0
+        self.difficulty = 1.0 + abs(ball_position.z) / 500.0 + self.difficulty_bonus
         self.score_multiplier = 1.0 + abs(ball_position.z) / 1000.0
         
-        # Update combo system
-        if self.combo_timer > 0:
-            self.combo_timer -= delta_time
-            if self.combo_timer <= 0:
-                self.reset_combo()
-        
-        # Update particles
-        self.particles = [p for p in self.particles if p.life_time > 0]
-        for particle in self.particles:
-            particle.update(delta_time)
-        
-        # Update game objects
-        for obstacle in self.obstacles:
-            obstacle.update(delta_time)
-        for power_up in self.power_ups:
-            power_up.update(delta_time)
-            
-        # Generate road and obstacles
-        while self.last_segment_z > ball_position.z - 800:
+        # Generate road and obstacles up to the end of the level
+        while (self.last_segment_z > ball_position.z - self.quality.road_look_ahead and
+               self.road_continues()):
             self.generate_road_segment()
             
-        if ball_position.z <= self.obstacle_start_distance:
-            while self.next_obstacle_z > ball_position.z - 400:
+        # Rows are generated a look-ahead in front of the ball, starting
+        # as soon as the first one is within that distance, so none ever
+        # appears on top of the ball
+        row_limit = ball_position.z - ROW_LOOK_AHEAD
+        if row_limit <= self.obstacle_start_distance:
+            while self.next_obstacle_z > row_limit and self.rows_continue():
                 self.generate_obstacle()
             
-        # Cleanup
-        self.cleanup(ball_position)
+        # The ball travels towards -z, so segments at a larger z than the
+        # ball (plus a margin) have been passed
+        segment_limit = ball_position.z + 400  # Keep more road segments for smoother visuals
+        road_segments = self.road_segments
+        while road_segments and road_segments[0] > segment_limit:
+            road_segments.popleft()
+
+    def spawn_obstacle(self, x, y, z, width, height, depth, color, moving=False,
+                       move_range=0.0, move_speed=0.0, spinning=False, spin_radius=0.0,
+                       spin_speed=0.0):
+        if spinning:
+            slot = self.store.spawn_obstacle(x, y, z, width, height, depth, color, MOTION_SPIN,
+                                             0.0, spin_radius, spin_speed)
+        elif moving:
+            slot = self.store.spawn_obstacle(x, y, z, width, height, depth, color,
+                                             MOTION_OSCILLATE, x, move_range, move_speed)
+        else:
+            slot = self.store.spawn_obstacle(x, y, z, width, height, depth, color, MOTION_NONE)
+        if self.telemetry is not None:
+            self.telemetry.spawn("obstacle", x, z)
+        return slot
+
+    def spawn_power_up(self, x, y, z, type):
+        slot = self.store.spawn_power_up(x, y, z, POWER_UP_INDEX[type], POWER_UPS[type].color)
+        if self.telemetry is not None:
+            self.telemetry.spawn(type, x, z)
+        return slot
+
+    def spawn_particle(self, x, y, z, vx, vy, vz, color, life_time, size=0.2):
+        return self.store.spawn_particle(x, y, z, vx, vy, vz, color, life_time, size)
 
     def add_particle_effect(self, position, type="collect"):
         if type == "collect":
-            for _ in range(20):
-                angle = uniform(0, math.pi * 2)
-                speed = uniform(5.0, 10.0)
-                self.particles.append(
-                    Particle(
-                        Vector3(position.x, position.y, position.z),
-                        Vector3(
-                            math.cos(angle) * speed,
-                            uniform(5.0, 10.0),
-                            math.sin(angle) * speed
-                        ),
-                        GOLD,
-                        0.5
-                    )
+            for _ in range(self.particle_count(20)):
+                angle = EFFECTS_RANDOM.uniform(0, math.pi * 2)
+                speed = EFFECTS_RANDOM.uniform(5.0, 10.0)
+                self.spawn_particle(
+                    position.x, position.y, position.z,
+                    math.cos(angle) * speed,
+                    EFFECTS_RANDOM.uniform(5.0, 10.0),
+                    math.sin(angle) * speed,
+                    GOLD,
+                    0.5
                 )
         elif type == "combo":
-            for _ in range(30):
-                angle = uniform(0, math.pi * 2)
-                speed = uniform(8.0, 15.0)
-                self.particles.append(
-                    Particle(
-                        Vector3(position.x, position.y, position.z),
-                        Vector3(
-                            math.cos(angle) * speed,
-                            uniform(8.0, 15.0),
-                            math.sin(angle) * speed
-                        ),
-                        PURPLE,
-                        0.8
-                    )
+            for _ in range(self.particle_count(30)):
+                angle = EFFECTS_RANDOM.uniform(0, math.pi * 2)
+                speed = EFFECTS_RANDOM.uniform(8.0, 15.0)
+                self.spawn_particle(
+                    position.x, position.y, position.z,
+                    math.cos(angle) * speed,
+                    EFFECTS_RANDOM.uniform(8.0, 15.0),
+                    math.sin(angle) * speed,
+                    PURPLE,
+                    0.8
                 )
 
-    def add_combo(self):
+    def particle_count(self, full_count):
+        return max(1, int(full_count * self.quality.particle_scale))
+
+    def add_combo(self, position):
         self.combo_count += 1
-        self.combo_timer = 3.0  # Reset combo timer
+        self.set_combo_timer(3.0)  # Reset combo timer
         self.combo_multiplier = min(4.0, 1.0 + self.combo_count * 0.5)  # Max 4x multiplier
         if self.combo_count >= 3:  # Particle effect for combos of 3 or more
-            self.add_particle_effect(ball.position, "combo")
+            self.add_particle_effect(position, "combo")
+        if self.telemetry is not None:
+            self.telemetry.combo(self.combo_count, self.combo_multiplier)
 
     def reset_combo(self):
         self.combo_count = 0
         self.combo_multiplier = 1.0
-        self.combo_timer = 0
+        self.set_combo_timer(0)
+        if self.telemetry is not None:
+            self.telemetry.combo(0, 1.0)
+
+    def set_combo_timer(self, seconds):
+        self.scheduler.cancel(self.combo_timer)
+        self.combo_timer = None
+        if seconds > 0:
+            self.combo_timer = self.scheduler.schedule(seconds, self.reset_combo)
 
     def generate_obstacle(self):
-        from random import choice, random, randint, uniform
-        
         # Number of obstacles based on difficulty
         max_obstacles = min(3, int(1 + self.difficulty / 2))
         num_obstacles = randint(1, max_obstacles)
         
+        row_start = self.store.next_serial
+        reach_state = None
         for _ in range(num_obstacles):
-            patterns = [
-                (self.create_slalom_obstacle, 0.25),
-                (self.create_moving_gate, 0.25),
-                (self.create_narrow_passage, 0.15),
-                (self.create_jumping_obstacle, 0.2),
-                (self.create_spinning_obstacle, 0.15)  # New obstacle type
-            ]
-            
-            total_weight = sum(weight for _, weight in patterns)
-            r = uniform(0, total_weight)
-            current_weight = 0
-            
-            for pattern, weight in patterns:
-                current_weight += weight
-                if r <= current_weight:
-                    pattern()
+            # Patterns that would close off the row are undone and redrawn
+            for _ in range(3):
+                pattern_start = self.store.next_serial
+                spawn_pattern(self, self.patterns.choose("row"), self.next_obstacle_z)
+                state = self.check_obstacles(row_start)
+                if state is not None:
+                    reach_state = state
                     break
+                self.discard_obstacles(pattern_start)
+                self.rejected_patterns += 1
+        if reach_state is not None:
+            self.feasible, self.feasible_z = reach_state
 
         # Power-up generation
         if random() < 0.3:
-            power_up_types = [
-                ("speed_boost", 0.3),
-                ("shield", 0.25),
-                ("points", 0.25),
-                ("magnet", 0.2)
-            ]
-            
-            total_weight = sum(weight for _, weight in power_up_types)
+            total_weight = sum(p_type.spawn_weight for p_type in POWER_UP_TYPES)
             r = uniform(0, total_weight)
             current_weight = 0
             
-            for p_type, weight in power_up_types:
-                current_weight += weight
+            for p_type in POWER_UP_TYPES:
+                current_weight += p_type.spawn_weight
                 if r <= current_weight:
-                    self.power_ups.append(
-                        PowerUp(
-                            Vector3(uniform(-3, 3), 1.0, self.next_obstacle_z),
-                            p_type
-                        )
-                    )
+                    self.spawn_power_up(uniform(-3, 3), 1.0, self.next_obstacle_z, p_type.name)
                     break
         
         # Update next obstacle position
@@ -259,248 +234,100 @@ class Level:
         max_space = max(30, 60 - self.difficulty * 2)
         self.next_obstacle_z -= randint(int(min_space), int(max_space))
 
-    def create_slalom_obstacle(self):
-        x_pos = uniform(2.0, 4.0) * (-1 if len(self.obstacles) % 2 == 0 else 1)
-        self.obstacles.append(
-            Obstacle(
-                Vector3(x_pos, 1.0, self.next_obstacle_z),
-                Vector3(2.0, 2.0, 2.0),
-                DARKBROWN,
-                moving=random() < 0.3  # 30% chance to be moving
-            )
-        )
+    def check_obstacles(self, start):
+        # Whether the obstacles spawned since serial `start` leave the ball a
+        # way through; returns the reachability state after them, or None
+        # when they are unwinnable
+        if self.envelope is None:
+            return (self.feasible, self.feasible_z)
+        if self.feasible is None:
+            self.feasible = self.envelope.full_road()
+        new_obstacles = self.store.shapes(self.store.slots(KIND_OBSTACLE, start))
+        return self.envelope.check(self.feasible, self.feasible_z, new_obstacles)
 
-    def create_moving_gate(self):
-        speed = min(4.0, 2.0 + self.difficulty * 0.5)  # Speed increases with difficulty
-        self.obstacles.append(
-            Obstacle(
-                Vector3(0.0, 1.0, self.next_obstacle_z),
-                Vector3(6.0, 2.0, 2.0),
-                MAROON,
-                moving=True,
-                move_range=uniform(2.0, 4.0),
-                move_speed=speed
-            )
-        )
-
-    def create_narrow_passage(self):
-        gap_size = uniform(2.5, 3.5)
-        offset = uniform(-2.0, 2.0)  # Random position of the gap
-        self.obstacles.append(
-            Obstacle(
-                Vector3(-4.0 + offset, 1.0, self.next_obstacle_z),
-                Vector3(2.0, 2.0, 3.0),
-                DARKBLUE
-            )
-        )
-        self.obstacles.append(
-            Obstacle(
-                Vector3(4.0 + offset, 1.0, self.next_obstacle_z),
-                Vector3(2.0, 2.0, 3.0),
-                DARKBLUE
-            )
-        )
-
-    def create_jumping_obstacle(self):
-        width = uniform(3.0, 5.0)
-        x_offset = uniform(-2.0, 2.0)
-        self.obstacles.append(
-            Obstacle(
-                Vector3(x_offset, 0.5, self.next_obstacle_z),
-                Vector3(width, 1.0, 2.0),
-                PURPLE
-            )
-        )
-
-    def create_spinning_obstacle(self):
-        # Create a spinning obstacle that rotates around the center
-        radius = uniform(2.0, 3.5)
-        self.obstacles.append(
-            Obstacle(
-                Vector3(0.0, 1.0, self.next_obstacle_z),
-                Vector3(4.0, 0.5, 0.5),
-                RED,
-                spinning=True,
-                spin_radius=radius,
-                spin_speed=uniform(2.0, 3.0 + self.difficulty)
-            )
-        )
-
-    def cleanup(self, ball_position):
-        # Keep more road segments for smoother visuals
-        self.road_segments = [seg for seg in self.road_segments 
-                            if seg > ball_position.z - 400]  # Increased kept segments
-        
-        # Clean up old obstacles
-        self.obstacles = [obs for obs in self.obstacles 
-                         if obs.position.z > ball_position.z - 200]
-        
-        # Clean up old power-ups
-        self.power_ups = [pow for pow in self.power_ups 
-                         if pow.active and pow.position.z > ball_position.z - 200]
+    def discard_obstacles(self, start):
+        self.store.destroy(self.store.slots(KIND_OBSTACLE, start))
 
     def generate_road_segment(self):
         self.last_segment_z -= self.segment_length
         self.road_segments.append(self.last_segment_z)
 
-    def draw(self, ball_position):
-        # Draw road segments
-        for z in self.road_segments:
-            draw_cube(
-                (0.0, -0.5, z),
-                10.0, 1.0, self.segment_length,
-                DARKGRAY
-            )
-            # Road markings
-            draw_cube(
-                (0.0, 0.01, z),
-                0.5, 0.1, self.segment_length * 0.5,
-                YELLOW
-            )
-            # Side barriers with glow
-            barrier_color = Color(41, 41, 41, 255)  # Dark gray
-            glow_size = 1.0 + abs(math.sin(get_time() * 2 + z * 0.1)) * 0.1
-            for x in [-5, 5]:
-                draw_cube(
-                    (x, 1.0, z),
-                    0.5 * glow_size, 2.0 * glow_size, self.segment_length,
-                    fade(barrier_color, 0.7)
-                )
-                draw_cube(
-                    (x, 1.0, z),
-                    0.3, 1.8, self.segment_length,
-                    barrier_color
-                )
+def _window(items, near_z, far_z, key):
+    # Items sorted by descending z with near_z >= z >= far_z
+    return items[bisect_left(items, -near_z, key=key):bisect_right(items, -far_z, key=key)]
 
-        # Draw obstacles and power-ups
-        for obstacle in self.obstacles:
-            obstacle.draw()
-        for power_up in self.power_ups:
-            power_up.draw()
-            
-        # Draw particles
-        for particle in self.particles:
-            particle.draw()
+def draw_level(queue, state, quality, animation=None, ball_z=None):
+    # Draws a level snapshot from systems.render_system(); with ball_z only
+    # the part a camera following that ball can see
+    segment_length, segments, obstacles, power_ups, particles = state
+    if ball_z is not None:
+        near_z = ball_z + VIEW_BEHIND
+        far_z = ball_z - quality.draw_distance
+        segments = _window(segments, near_z + segment_length, far_z, neg)
+        entity_z = lambda entity: -entity[2]
+        obstacles = _window(obstacles, near_z, far_z, entity_z)
+        power_ups = _window(power_ups, near_z, far_z, entity_z)
+        particles = _window(particles, near_z, far_z, entity_z)
+    glow = quality.glow_passes > 0
+    barrier_color = Color(41, 41, 41, 255)  # Dark gray
+    barrier_glow = glow and animation is None
 
-def create_levels():
-    levels = []
-    
-    # Create level 1
-    level1 = Level()
-    
-    # Add initial obstacles
-    level1.obstacles.append(
-        Obstacle(
-            Vector3(5.0, 1.0, 20.0),
-            Vector3(3.0, 2.0, 2.0),
-            DARKBROWN
-        )
-    )
-    
-    level1.obstacles.append(
-        Obstacle(
-            Vector3(-5.0, 1.0, 40.0),
-            Vector3(3.0, 2.0, 2.0),
-            DARKBROWN
-        )
-    )
-    
-    level1.obstacles.append(
-        Obstacle(
-            Vector3(0.0, 1.0, 60.0),
-            Vector3(4.0, 2.0, 2.0),
-            MAROON,
-            moving=True,
-            move_range=4.0,
-            move_speed=2.0
-        )
-    )
-    
-    # Add power-ups
-    level1.power_ups.append(
-        PowerUp(
-            Vector3(0.0, 1.0, 30.0),
-            "speed_boost"
-        )
-    )
-    
-    levels.append(level1)
-    
-    # Create level 2
-    level2 = Level()
-    
-    # Add initial obstacles
-    level2.obstacles.append(
-        Obstacle(
-            Vector3(-4.0, 1.0, 20.0),
-            Vector3(3.0, 3.0, 2.0),
-            RED,
-            moving=True,
-            move_range=3.0,
-            move_speed=3.0
-        )
-    )
-    
-    level2.obstacles.append(
-        Obstacle(
-            Vector3(4.0, 1.0, 40.0),
-            Vector3(3.0, 3.0, 2.0),
-            RED,
-            moving=True,
-            move_range=3.0,
-            move_speed=2.0
+    # Draw road segments
+    for z in segments:
+        queue.cube(
+            0.0, -0.5, z,
+            10.0, 1.0, segment_length,
+            DARKGRAY
         )
-    )
-    
-    level2.obstacles.append(
-        Obstacle(
-            Vector3(-6.0, 1.0, 60.0),
-            Vector3(2.0, 4.0, 2.0),
-            BROWN
+        # Road markings
+        queue.cube(
+            0.0, 0.01, z,
+            0.5, 0.1, segment_length * 0.5,
+            YELLOW
         )
-    )
-    
-    level2.obstacles.append(
-        Obstacle(
-            Vector3(6.0, 1.0, 60.0),
-            Vector3(2.0, 4.0, 2.0),
-            BROWN
-        )
-    )
-    
-    level2.obstacles.append(
-        Obstacle(
-            Vector3(0.0, 1.0, 80.0),
-            Vector3(6.0, 2.0, 2.0),
-            RED,
-            moving=True,
-            move_range=5.0,
-            move_speed=4.0
-        )
-    )
-    
-    # Add power-ups
-    level2.power_ups.append(
-        PowerUp(
-            Vector3(-3.0, 1.0, 30.0),
-            "speed_boost"
-        )
-    )
-    
-    level2.power_ups.append(
-        PowerUp(
-            Vector3(3.0, 1.0, 50.0),
-            "speed_boost"
-        )
-    )
-    
-    level2.power_ups.append(
-        PowerUp(
-            Vector3(0.0, 1.0, 70.0),
-            "speed_boost"
+        # Side barriers with glow
+        if barrier_glow:
+            glow_size = 1.0 + abs(math.sin(get_time() * 2 + z * 0.1)) * 0.1
+        for x in [-5, 5]:
+            if barrier_glow:
+                queue.cube(
+                    x, 1.0, z,
+                    0.5 * glow_size, 2.0 * glow_size, segment_length,
+                    fade(barrier_color, 0.7)
+                )
+            queue.cube(
+                x, 1.0, z,
+                0.3, 1.8, segment_length,
+                barrier_color
+            )
+
+    if animation is not None and glow and segments:
+        # One mesh pass for every barrier glow, ordered as the farthest segment
+        queue.custom(
+            PASS_TRANSLUCENT, animation.draw_barrier_glow,
+            segments, segment_length, fade(barrier_color, 0.7),
+            position=(0.0, 1.0, segments[-1])
         )
-    )
-    
-    levels.append(level2)
-    
-    return levels
+
+    # Draw obstacles and power-ups
+    for x, y, z, width, height, depth, color in obstacles:
+        queue.cube(x, y, z, width, height, depth, color)
+    if animation is not None:
+        queue.custom(PASS_SHADED, animation.draw_power_ups, power_ups, glow)
+    else:
+        if glow:
+            glow_size = 1.0 + abs(math.sin(get_time() * 3)) * 0.2
+        for x, y, z, color in power_ups:
+            # Draw power-up with glow effect
+            if glow:
+                queue.cube(
+                    x, y, z,
+                    0.8 * glow_size, 0.8 * glow_size, 0.8 * glow_size,
+                    fade(color, 0.5)
+                )
+            # Inner cube
+            queue.cube(x, y, z, 0.5, 0.5, 0.5, color)
+
+    # Draw particles
+    for x, y, z, radius, color in particles:
+        queue.sphere(x, y, z, radius, color)
@@ -2,8 +2,31 @@ from pyray import *
 from dataclasses import dataclass
 from typing import NamedTuple
 from game_manager import GameManager, GameState
-from levels import create_levels
+from levels import draw_level
+from patterns import load_library
+from quality import QualityGovernor
+from shaders import AnimationShader
+from telemetry import TelemetryWriter
+from scores import ScoreStore
+from ghost_race import GhostRaceClient, DEFAULT_PORT
+from replays import ReplayArchive, ReplayRecorder, RESUMED_SEED, INPUT_LEFT, INPUT_RIGHT, INPUT_JUMP
+from ghost_layer import GhostLayer
+from capture import FrameCapture
+from scheduler import Scheduler
+from render_queue import RenderQueue, PASS_TRANSLUCENT
+from power_ups import POWER_UPS
+from reachability import MovementEnvelope
+from input_latency import InputLatencyMonitor
+from gc_monitor import GCMonitor, FrameCollector
+from simulation import Simulation, RenderSnapshot
+from snapshot import (
+    save_snapshot, restore_snapshot, write_snapshot_file, read_snapshot_file,
+    SnapshotError
+)
 import math
+import os
+import random
+import time
 
 # Initialize window and game settings
 SCREEN_WIDTH = 1280
@@ -11,6 +34,34 @@ SCREEN_HEIGHT = 720
 GRAVITY = 9.81
 JUMP_FORCE = 15.0
 MOVE_SPEED = 10.0
+CHECKPOINT_PATH = "checkpoint.bgss"
+SCORES_PATH = "scores.db"
+REPLAYS_PATH = "replays.bgra"
+CAPTURE_DIRECTORY = "captures"
+PLAYER_NAME = os.environ.get("BALL_GAME_PLAYER", "player")
+GHOST_SERVER = os.environ.get("BALL_GAME_GHOST_SERVER")  # "host[:port]" to race live ghosts
+GHOST_ROOM = os.environ.get("BALL_GAME_GHOST_ROOM", "default")
+GHOST_REPLAYS = int(os.environ.get("BALL_GAME_GHOST_REPLAYS", "32"))  # Best past runs shown as ghosts
+# Poll input again right before it is handed to the simulation (toggle
+# with F4); a threaded simulation picks it up on its next tick
+LATE_INPUT = os.environ.get("BALL_GAME_LATE_INPUT", "0") == "1"
+# Freeze startup objects and only collect in frames with spare time (toggle with F6)
+MANAGED_GC = os.environ.get("BALL_GAME_MANAGED_GC", "0") == "1"
+# Simulate on a separate thread at a fixed tick rate; 0 ticks once per frame
+SIM_THREAD = os.environ.get("BALL_GAME_SIM_THREAD", "1") == "1"
+SIM_TICK_RATE = int(os.environ.get("BALL_GAME_TICK_RATE", "60"))
+# Local split-screen players (1-4) racing through one shared world
+PLAYERS = max(1, min(4, int(os.environ.get("BALL_GAME_PLAYERS", "1"))))
+# Left, right and jump keys per player
+PLAYER_KEYS = (
+    (KEY_LEFT, KEY_RIGHT, KEY_SPACE),
+    (KEY_A, KEY_D, KEY_W),
+    (KEY_J, KEY_L, KEY_I),
+    (KEY_KP_4, KEY_KP_6, KEY_KP_8),
+)
+INPUT_BITS = 3  # Each player's input bits sit this far above the previous player's
+INPUT_MASK = INPUT_LEFT | INPUT_RIGHT | INPUT_JUMP
+LANE_SPACING = 2.0  # Starting x distance between balls
 
 class Color(NamedTuple):
     r: int
@@ -19,22 +70,21 @@ class Color(NamedTuple):
     a: int
 
 class Ball:
-    def __init__(self):
-        self.position = Vector3(0.0, 1.0, 0.0)
+    def __init__(self, scheduler, x=0.0, name="player"):
+        self.scheduler = scheduler
+        self.name = name  # Recorded with the run in the score store
+        self.position = Vector3(x, 1.0, 0.0)
         self.velocity = Vector3(0.0, 0.0, 0.0)
         self.radius = 0.5
         self.is_grounded = False
+        self.crashed = False  # Out of the run; the other balls race on
         self.score = 0
         
         # Power-up states
         self.has_speed_boost = False
         self.has_shield = False
         self.has_magnet = False
-        self.power_up_timers = {
-            "speed_boost": 0,
-            "shield": 0,
-            "magnet": 0
-        }
+        self.power_up_timers = {}  # Scheduler timers of the active timed power-ups
         
         # Achievement tracking
         self.speed_boost_count = 0
@@ -47,34 +97,24 @@ class Ball:
         self.max_side_speed = 15.0
         self.side_acceleration = 50.0
         self.side_drag = 8.0
+        self.jump_speed = 12.0
+        self.gravity = 35.0
+        self.road_half_width = 4.5
         
         # Visual effects
         self.trail_color = BLUE
         self.shield_rotation = 0
 
-    def update(self, delta_time):
-        # Update power-up timers
-        for power_up, timer in self.power_up_timers.items():
-            if timer > 0:
-                self.power_up_timers[power_up] -= delta_time
-                if self.power_up_timers[power_up] <= 0:
-                    if power_up == "speed_boost":
-                        self.has_speed_boost = False
-                        self.speed_boost_count = 0  # Reset count when speed boost expires
-                    elif power_up == "shield":
-                        self.has_shield = False
-                    elif power_up == "magnet":
-                        self.has_magnet = False
-
+    def update(self, delta_time, inputs):
         # Update forward speed based on power-ups
         current_speed = self.forward_speed * (1.5 if self.has_speed_boost else 1.0)
         self.velocity.z = -current_speed
         
         # Horizontal movement with smooth acceleration
         target_x_speed = 0
-        if is_key_down(KEY_LEFT):
+        if inputs & INPUT_LEFT:
             target_x_speed = -self.max_side_speed
-        elif is_key_down(KEY_RIGHT):
+        elif inputs & INPUT_RIGHT:
             target_x_speed = self.max_side_speed
             
         # Smoothly adjust horizontal speed
@@ -89,7 +129,7 @@ class Ball:
 
         # Apply gravity
         if not self.is_grounded:
-            self.velocity.y -= 35.0 * delta_time
+            self.velocity.y -= self.gravity * delta_time
 
         # Update position
         self.position.x += self.velocity.x * delta_time
@@ -105,13 +145,14 @@ class Ball:
             self.is_grounded = False
 
         # Wall collisions
-        if abs(self.position.x) >= 4.5 - self.radius:
-            self.position.x = (4.5 - self.radius) if self.position.x > 0 else -(4.5 - self.radius)
+        limit = self.road_half_width - self.radius
+        if abs(self.position.x) >= limit:
+            self.position.x = limit if self.position.x > 0 else -limit
             self.velocity.x *= -0.5
 
         # Jump control
-        if is_key_pressed(KEY_SPACE) and self.is_grounded:
-            self.velocity.y = 12.0
+        if inputs & INPUT_JUMP and self.is_grounded:
+            self.velocity.y = self.jump_speed
             self.is_grounded = False
             
         # Update shield rotation
@@ -132,331 +173,553 @@ class Ball:
         self.total_power_ups += 1
         self.consecutive_power_ups += 1
         
-        if power_up_type == "speed_boost":
-            self.has_speed_boost = True
-            self.power_up_timers["speed_boost"] = 5.0
-            self.speed_boost_count += 1
-        elif power_up_type == "shield":
-            self.has_shield = True
-            self.power_up_timers["shield"] = 10.0
-        elif power_up_type == "points":
-            self.score += 1000
-        elif power_up_type == "magnet":
-            self.has_magnet = True
-            self.power_up_timers["magnet"] = 8.0
-
-    def draw(self):
-        # Draw shield effect if active
-        if self.has_shield:
-            shield_scale = 1.2 + math.sin(get_time() * 4) * 0.1
-            shield_color = fade(SKYBLUE, 0.5)
-            draw_sphere(
-                (self.position.x, self.position.y, self.position.z),
-                self.radius * shield_scale,
-                shield_color
-            )
+        power_up = POWER_UPS[power_up_type]
+        self.score += power_up.score
+        if power_up.on_apply is not None:
+            power_up.on_apply(self)
+        if power_up.duration > 0:
+            self.set_power_up_timer(power_up_type, power_up.duration)
 
-        # Trail effect
-        trail_length = 15
-        trail_spacing = 0.15
-        for i in range(trail_length):
-            alpha = 1.0 - (i / trail_length)
-            trail_color = Color(
-                int(self.trail_color[0] * alpha),
-                int(self.trail_color[1] * alpha),
-                int(self.trail_color[2] * alpha),
-                int(255 * alpha)
+    def set_power_up_timer(self, power_up_type, seconds):
+        # (Re)starts a timed power-up, or ends it early when seconds is 0
+        self.scheduler.cancel(self.power_up_timers.pop(power_up_type, None))
+        setattr(self, POWER_UPS[power_up_type].flag, seconds > 0)
+        if seconds > 0:
+            self.power_up_timers[power_up_type] = self.scheduler.schedule(
+                seconds, self.expire_power_up, power_up_type
             )
-            trail_pos = Vector3(
-                self.position.x,
-                self.position.y,
-                self.position.z + i * trail_spacing
-            )
-            draw_sphere(
-                (trail_pos.x, trail_pos.y, trail_pos.z),
-                self.radius * (1.0 - i/trail_length * 0.5),
-                trail_color
-            )
-        
-        # Main ball with glow effect
-        glow_size = 1.0 + abs(math.sin(get_time() * 3)) * 0.1
-        draw_sphere(
-            (self.position.x, self.position.y, self.position.z),
-            self.radius * glow_size,
-            fade(self.trail_color, 0.5)
+
+    def power_up_remaining(self, power_up_type):
+        return self.scheduler.remaining(self.power_up_timers.get(power_up_type))
+
+    def expire_power_up(self, power_up_type):
+        del self.power_up_timers[power_up_type]
+        power_up = POWER_UPS[power_up_type]
+        setattr(self, power_up.flag, False)
+        if power_up.on_expire is not None:
+            power_up.on_expire(self)
+
+    def render_state(self):
+        return (self.position.x, self.position.y, self.position.z,
+                self.radius, self.trail_color)
+
+def draw_ball(queue, state, shield, quality):
+    # Draws a Ball.render_state() snapshot
+    x, y, z, radius, trail_color = state
+
+    # Draw shield effect if active
+    if shield:
+        shield_scale = 1.2 + math.sin(get_time() * 4) * 0.1
+        shield_color = fade(SKYBLUE, 0.5)
+        queue.sphere(x, y, z, radius * shield_scale, shield_color)
+
+    # Trail effect
+    trail_length = quality.trail_length
+    trail_spacing = 0.15
+    for i in range(trail_length):
+        alpha = 1.0 - (i / trail_length)
+        color = (
+            int(trail_color[0] * alpha),
+            int(trail_color[1] * alpha),
+            int(trail_color[2] * alpha),
+            int(255 * alpha)
         )
-        draw_sphere(
-            (self.position.x, self.position.y, self.position.z),
-            self.radius * 0.8,
-            self.trail_color
+        queue.sphere(
+            x, y, z + i * trail_spacing,
+            radius * (1.0 - i/trail_length * 0.5),
+            color
         )
+    
+    # Main ball with glow effect
+    if quality.glow_passes > 0:
+        glow_size = 1.0 + abs(math.sin(get_time() * 3)) * 0.1
+        queue.sphere(x, y, z, radius * glow_size, fade(trail_color, 0.5))
+    queue.sphere(x, y, z, radius * 0.8, trail_color)
 
-class Achievement:
-    def __init__(self, name, description, condition_fn):
-        self.name = name
-        self.description = description
-        self.condition_fn = condition_fn
-        self.unlocked = False
-        self.show_time = 0
-
-class GameManager:
-    def __init__(self, levels):
-        self.levels = levels
-        self.current_level = 0
-        self.current_level_data = levels[self.current_level]
-        self.state = GameState.PLAYING
-        self.ball_position = Vector3(0, 0, 0)
-        self.high_score = 0
-        
-        # Achievement system
-        self.achievements = [
-            Achievement(
-                "Speed Demon",
-                "Collect 3 speed boosts in a row",
-                lambda ball: ball.speed_boost_count >= 3
-            ),
-            Achievement(
-                "Combo Master",
-                "Get a 3x combo multiplier",
-                lambda ball: self.current_level_data.combo_multiplier >= 3
-            ),
-            Achievement(
-                "Distance Runner",
-                "Travel 1000 meters",
-                lambda ball: abs(ball.position.z) >= 1000
-            ),
-            Achievement(
-                "Power Collector",
-                "Collect 20 power-ups in total",
-                lambda ball: ball.total_power_ups >= 20
-            ),
-            Achievement(
-                "Chain Master",
-                "Collect 5 power-ups in a row",
-                lambda ball: ball.consecutive_power_ups >= 5
-            )
-        ]
-
-    def update(self, ball, delta_time):
-        if self.state == GameState.PLAYING:
-            # Check collisions
-            for obstacle in self.current_level_data.obstacles:
-                if self.check_collision(ball, obstacle):
-                    if not ball.has_shield:
-                        self.state = GameState.GAME_OVER
-                        if ball.score > self.high_score:
-                            self.high_score = ball.score
-                    else:
-                        ball.has_shield = False  # Remove shield on hit
-                        self.current_level_data.add_particle_effect(ball.position, "collect")
-            
-            # Check achievements
-            for achievement in self.achievements:
-                if not achievement.unlocked and achievement.condition_fn(ball):
-                    achievement.unlocked = True
-                    achievement.show_time = 3.0  # Show for 3 seconds
-                    
-            # Update achievement timers
-            for achievement in self.achievements:
-                if achievement.show_time > 0:
-                    achievement.show_time -= delta_time
-
-    def check_collision(self, ball, obstacle):
-        # Improved collision detection for different obstacle types
-        if obstacle.spinning:
-            # For spinning obstacles, check distance to the center line
-            dx = ball.position.x - obstacle.position.x
-            dy = ball.position.y - obstacle.position.y
-            dz = ball.position.z - obstacle.position.z
-            
-            if abs(dz) < obstacle.size.z + ball.radius:
-                distance_to_center = math.sqrt(dx * dx + dy * dy)
-                return distance_to_center < obstacle.spin_radius + ball.radius
-        else:
-            # Box collision for regular obstacles
-            half_size = Vector3(
-                obstacle.size.x / 2,
-                obstacle.size.y / 2,
-                obstacle.size.z / 2
-            )
-            
-            return (
-                abs(ball.position.x - obstacle.position.x) < half_size.x + ball.radius and
-                abs(ball.position.y - obstacle.position.y) < half_size.y + ball.radius and
-                abs(ball.position.z - obstacle.position.z) < half_size.z + ball.radius
-            )
+def read_player_input():
+    # (held, pressed) input masks for every player, from the last poll
+    held = 0
+    pressed = 0
+    for player in range(PLAYERS):
+        left, right, jump = PLAYER_KEYS[player]
+        shift = player * INPUT_BITS
+        held |= ((INPUT_LEFT if is_key_down(left) else 0) |
+                 (INPUT_RIGHT if is_key_down(right) else 0)) << shift
+        pressed |= (INPUT_JUMP if is_key_pressed(jump) else 0) << shift
+    return held, pressed
+
+def viewport_layout(players):
+    # Screen rectangles (x, y, width, height): one player gets the whole
+    # screen, two split it side by side, three or four share a 2x2 grid
+    if players == 1:
+        return [(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)]
+    if players == 2:
+        half = SCREEN_WIDTH // 2
+        return [(0, 0, half, SCREEN_HEIGHT), (half, 0, half, SCREEN_HEIGHT)]
+    width, height = SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2
+    return [((i % 2) * width, (i // 2) * height, width, height) for i in range(players)]
 
-    def draw_level(self):
-        self.current_level_data.draw(self.ball_position)
+def draw_player_hud(queue, snapshot, player, x, y, width):
+    # Distance, score and power-ups of one player, inside their viewport
+    score, speed_boost, shield, magnet, crashed = snapshot.players[player]
+    ball_z = snapshot.balls[player][2]
+    queue.text(f"Distance: {int(-ball_z)} m", x + 20, y + 20, 20, WHITE)
+    queue.text(f"Score: {score}", x + 20, y + 50, 20, GOLD)
+    if len(snapshot.players) > 1:
+        queue.text(f"P{player + 1}  Level {snapshot.level_number}",
+                   x + width - 150, y + 50, 20, WHITE)
+    else:
+        queue.text(f"Level {snapshot.level_number}", x + width - 120, y + 50, 20, WHITE)
+    if crashed:
+        queue.text("Crashed", x + 20, y + 80, 20, RED)
+        return
+
+    # Draw combo multiplier
+    if snapshot.combo_multiplier > 1:
+        queue.text(
+            f"Combo: x{snapshot.combo_multiplier:.1f}",
+            x + 20, y + 80, 20, PURPLE
+        )
+
+    # Draw active power-ups
+    y_offset = y + 110
+    if speed_boost:
+        queue.text("Speed Boost!", x + 20, y_offset, 20, GREEN)
+        y_offset += 30
+    if shield:
+        queue.text("Shield Active", x + 20, y_offset, 20, SKYBLUE)
+        y_offset += 30
+    if magnet:
+        queue.text("Magnet Active", x + 20, y_offset, 20, PURPLE)
 
 def main():
     # Initialize window
     init_window(SCREEN_WIDTH, SCREEN_HEIGHT, "Endless Runner Ball Game")
     set_target_fps(60)
 
-    # Initialize camera
-    camera = Camera3D()
-    camera.position = Vector3(0.0, 6.0, 10.0)
-    camera.target = Vector3(0.0, 0.0, 0.0)
-    camera.up = Vector3(0.0, 1.0, 0.0)
-    camera.fovy = 60.0
-    camera.projection = CAMERA_PERSPECTIVE
+    # One camera per player; with split screen each view is drawn into its
+    # own render texture and the textures are put on screen together
+    viewports = viewport_layout(PLAYERS)
+    cameras = []
+    for _ in viewports:
+        camera = Camera3D()
+        camera.position = Vector3(0.0, 6.0, 10.0)
+        camera.target = Vector3(0.0, 0.0, 0.0)
+        camera.up = Vector3(0.0, 1.0, 0.0)
+        camera.fovy = 60.0
+        camera.projection = CAMERA_PERSPECTIVE
+        cameras.append(camera)
+    view_targets = []
+    if PLAYERS > 1:
+        view_targets = [load_render_texture(width, height) for _, _, width, height in viewports]
+
+    # Scales effect quality down on slow machines, keeps its tier across restarts
+    quality_governor = QualityGovernor()
+
+    # Power-up and barrier animation runs on the GPU when the shader compiles,
+    # otherwise the CPU fallback in levels.py is used
+    animation = AnimationShader()
+    if not animation.ready:
+        animation.unload()
+        animation = None
+
+    # Per-run event log, written to disk by a background thread
+    telemetry = TelemetryWriter(time.strftime("telemetry-%Y%m%d-%H%M%S.bgtl"))
+    frame_number = 0
+
+    # Run history; only the best score is read at startup
+    scores = ScoreStore(SCORES_PATH)
+
+    # Every finished run is appended to the replay archive in the background
+    replay_archive = ReplayArchive(REPLAYS_PATH)
+    replay = None
+    # Replays and ghosts follow a single ball, so split screen runs without them
+    ghost_layer = GhostLayer(GHOST_REPLAYS) if GHOST_REPLAYS > 0 and PLAYERS == 1 else None
+
+    # F12 toggles frame capture; encoding happens on worker threads
+    frame_capture = FrameCapture(CAPTURE_DIRECTORY, get_render_width(), get_render_height())
+
+    # Every draw goes through the render queue; F3 shows its per-pass counts
+    render_queue = RenderQueue()
+    show_render_stats = False
+
+    # Key press -> sim tick -> presented frame timings, shown with F3
+    input_latency = InputLatencyMonitor((KEY_LEFT, KEY_RIGHT, KEY_SPACE))
+    late_input = LATE_INPUT
+
+    # GC pauses per frame, and frame-budgeted collection when enabled
+    gc_monitor = GCMonitor()
+    gc_monitor.telemetry = telemetry
+    gc_collector = FrameCollector(gc_monitor)
+
+    def start_replay(resume=False):
+        nonlocal replay
+        if resume:
+            # Reseeding would throw away the RNG state just restored
+            seed = RESUMED_SEED
+        else:
+            # Seed the run so it can be resimulated from the replay
+            seed = random.getrandbits(63)
+            random.seed(seed)
+        replay = ReplayRecorder(seed, balls[0], start_time=game_manager.run_time)
+
+    # Live ghosts of other players, when a race server is configured
+    ghost_client = None
+    if GHOST_SERVER and PLAYERS == 1:
+        host, _, port = GHOST_SERVER.partition(":")
+        ghost_client = GhostRaceClient(host, int(port or DEFAULT_PORT), GHOST_ROOM, PLAYER_NAME)
 
     def reset_game():
-        nonlocal ball, game_manager
-        ball = Ball()
-        levels = create_levels()
-        game_manager = GameManager(levels)
+        nonlocal balls, game_manager, initial_snapshot
+        if initial_snapshot is None:
+            scheduler = Scheduler()
+            balls = [
+                Ball(scheduler, (i - (PLAYERS - 1) / 2.0) * LANE_SPACING,
+                     PLAYER_NAME if PLAYERS == 1 else f"{PLAYER_NAME} {i + 1}")
+                for i in range(PLAYERS)
+            ]
+            game_manager = GameManager(load_library(), scheduler)
+            initial_snapshot = save_snapshot(balls, game_manager, include_rng=False)
+        else:
+            # Restore the freshly built world in place instead of rebuilding it
+            high_score = game_manager.high_score
+            restore_snapshot(initial_snapshot, balls, game_manager)
+            game_manager.high_score = high_score
 
     # Create initial game objects
-    ball = None
+    balls = None
     game_manager = None
+    initial_snapshot = None
     reset_game()
+    game_manager.high_score = scores.best_score()
+    game_manager.telemetry = telemetry
+    game_manager.scores = scores
+    # Generated obstacles are checked against what a ball can actually reach
+    envelope = MovementEnvelope(balls[0])
+    game_manager.configure_levels(
+        quality=quality_governor.settings, animation=animation,
+        envelope=envelope, telemetry=telemetry
+    )
+    # Levels belong to the simulation thread, so tier changes reach them as
+    # commands between ticks
+    def apply_quality(settings):
+        game_manager.configure_levels(quality=settings)
 
-    # Game state variables
-    start_message_shown = True
+    quality_governor.add_listener(
+        lambda decision, settings: simulation.submit(apply_quality, settings)
+    )
+
+    # Only touched on the simulation thread once it is running
     game_started = False
 
+    # Commands queued by the render loop, run between simulation ticks
+    def start_run(resume=False):
+        nonlocal game_started
+        game_started = True
+        telemetry.run_started()
+        if PLAYERS == 1:
+            start_replay(resume)
+
+    def restart():
+        nonlocal game_started
+        reset_game()
+        game_started = False
+
+    def save_checkpoint():
+        write_snapshot_file(CHECKPOINT_PATH, save_snapshot(balls, game_manager))
+
+    def load_checkpoint():
+        # Quick load, also used to recover after a crash
+        try:
+            restore_snapshot(read_snapshot_file(CHECKPOINT_PATH), balls, game_manager)
+        except (OSError, SnapshotError):
+            return
+        start_run(resume=True)
+
+    def simulate(tick, delta_time, inputs):
+        nonlocal replay
+        if not (game_started and game_manager.running()):
+            return
+        if replay is not None and replay.needs_keyframe():
+            replay.add_keyframe(save_snapshot(balls, game_manager))
+        input_latency.consumed(tick)
+
+        # Update game objects; the world itself is updated once for all balls
+        game_manager.scheduler.update(delta_time)
+        for player, ball in enumerate(balls):
+            if not ball.crashed:
+                ball.update(delta_time, (inputs >> (player * INPUT_BITS)) & INPUT_MASK)
+        game_manager.update(balls, delta_time)
+        ball = balls[0]
+        if ghost_client is not None:
+            ghost_client.send_state(ball.position, ball.velocity)
+
+        if replay is not None:
+            replay.record_tick(inputs, delta_time, ball)
+            if game_manager.state == GameState.GAME_OVER:
+                replay_archive.append_async(replay.finish(ball.score))
+                replay = None
+
+    def capture(tick, sim_time):
+        level = game_manager.current_level_data
+        achievements = game_manager.achievements
+        return RenderSnapshot(
+            tick=tick,
+            sim_time=sim_time,
+            run_time=game_manager.run_time,
+            balls=tuple(ball.render_state() for ball in balls),
+            players=tuple((ball.score, ball.has_speed_boost, ball.has_shield,
+                           ball.has_magnet, ball.crashed) for ball in balls),
+            level=game_manager.render_state(balls),
+            started=game_started,
+            state=game_manager.state,
+            level_number=game_manager.current_level + 1,
+            high_score=game_manager.high_score,
+            combo_multiplier=level.combo_multiplier,
+            achievements_shown=tuple((a.name, a.description) for a in achievements
+                                     if a.show_timer is not None),
+            achievements_unlocked=tuple(a.name for a in achievements if a.unlocked),
+        )
+
+    # The simulation ticks on its own thread unless BALL_GAME_SIM_THREAD=0
+    simulation = Simulation(simulate, capture, SIM_TICK_RATE, threaded=SIM_THREAD)
+    if MANAGED_GC:
+        gc_collector.enable()  # Everything built so far lives for the whole session
+    simulation.start()
+
     while not window_should_close():
+        frame_start = time.perf_counter()
+        input_latency.polled()  # end_drawing polled input for this frame
+        gc_monitor.begin_frame(frame_number)
+        snapshot = simulation.front
+
+        # Drawn at the current quality tier
+        quality = quality_governor.settings
+
         # Update
         delta_time = get_frame_time()
+
+        if is_key_pressed(KEY_F3):
+            show_render_stats = not show_render_stats
+        if is_key_pressed(KEY_F4):
+            late_input = not late_input
+        if is_key_pressed(KEY_F6):
+            gc_collector.toggle()
+        if is_key_pressed(KEY_F12):
+            frame_capture.toggle()
+
+        # Quick save / quick load, also used to recover after a crash
+        if is_key_pressed(KEY_F5):
+            simulation.submit(save_checkpoint)
+        elif is_key_pressed(KEY_F9):
+            if ghost_layer is not None:
+                ghost_layer.load(replay_archive)
+            simulation.submit(load_checkpoint)
         
-        if not game_started:
+        if not snapshot.started:
             if is_key_pressed(KEY_SPACE):
-                game_started = True
-                start_message_shown = False
-        
-        if game_started and game_manager.state == GameState.PLAYING:
-            # Update game objects
-            ball.update(delta_time)
-            game_manager.ball_position = ball.position
-            game_manager.update(ball, delta_time)
-            
-            # Check power-up collisions
-            for power_up in game_manager.current_level_data.power_ups:
-                if power_up.active:
-                    distance = math.sqrt(
-                        (power_up.position.x - ball.position.x) ** 2 +
-                        (power_up.position.y - ball.position.y) ** 2 +
-                        (power_up.position.z - ball.position.z) ** 2
-                    )
-                    collect_radius = 1.0 if not ball.has_magnet else 3.0
-                    if distance < collect_radius:
-                        power_up.active = False
-                        ball.apply_power_up(power_up.type)
-                        game_manager.current_level_data.add_particle_effect(power_up.position)
-                        game_manager.current_level_data.add_combo()
-            
-            # Update camera with smooth follow and effects
-            target_cam_x = ball.position.x * 0.3
-            camera.position = Vector3(
-                target_cam_x,
-                6.0 + math.sin(get_time() * 2) * 0.2,  # Gentle camera bob
-                ball.position.z + 10.0
-            )
-            camera.target = Vector3(
-                target_cam_x,
-                1.0,
-                ball.position.z - 5.0
-            )
-            
-            # Update score with combo system
-            ball.score = int(
-                -ball.position.z * 
-                game_manager.current_level_data.score_multiplier * 
-                game_manager.current_level_data.combo_multiplier
-            )
-            
-        elif game_manager.state == GameState.GAME_OVER and is_key_pressed(KEY_R):
-            reset_game()
-            game_started = False
-            start_message_shown = True
+                if ghost_layer is not None:
+                    ghost_layer.load(replay_archive)
+                simulation.submit(start_run)
+        elif snapshot.state == GameState.GAME_OVER and is_key_pressed(KEY_R):
+            simulation.submit(restart)
+
+        held, pressed = read_player_input()
+        if late_input:
+            # Pick up keys that changed since end_drawing's poll. Held keys
+            # come from the late poll alone; it clears the earlier presses,
+            # so those are kept alongside the late ones
+            poll_input_events()
+            input_latency.polled()
+            held, late_pressed = read_player_input()
+            pressed |= late_pressed
+        simulation.set_input(held, pressed)
+        simulation.advance(delta_time)
+
+        # Render whatever the simulation published last
+        snapshot = simulation.front
+        playing = snapshot.started and snapshot.state != GameState.GAME_OVER
+        if playing:
+            if ghost_layer is not None:
+                ghost_layer.seek(snapshot.run_time)
+            # Crashed players watch whoever is furthest ahead
+            racing = [player for player, state in enumerate(snapshot.players) if not state[4]]
+            leader = min(racing, key=lambda player: snapshot.balls[player][2], default=0)
+            for player, camera in enumerate(cameras):
+                follow = leader if snapshot.players[player][4] else player
+                ball_x, _, ball_z, _, _ = snapshot.balls[follow]
+
+                # Update camera with smooth follow and effects
+                # Written in place to avoid allocating two vectors per frame
+                target_cam_x = ball_x * 0.3
+                camera.position.x = target_cam_x
+                camera.position.y = 6.0 + math.sin(get_time() * 2) * 0.2  # Gentle camera bob
+                camera.position.z = ball_z + 10.0
+                camera.target.x = target_cam_x
+                camera.target.y = 1.0
+                camera.target.z = ball_z - 5.0
+        else:
+            input_latency.discard()
 
         # Draw
         begin_drawing()
         clear_background(BLACK)
-        
-        begin_mode_3d(camera)
-        
-        # Draw game elements
-        game_manager.draw_level()
-        ball.draw()
-        
-        end_mode_3d()
-        
+        render_queue.begin_frame()
+        if animation is not None:
+            animation.begin_frame(get_time())
+
+        # The same culled world lists are submitted once per view
+        for player, camera in enumerate(cameras):
+            if view_targets:
+                begin_texture_mode(view_targets[player])
+                clear_background(BLACK)
+            begin_mode_3d(camera)
+
+            # Draw game elements
+            render_queue.begin(camera)
+            draw_level(render_queue, snapshot.level, quality, animation,
+                       camera.position.z - 10.0)  # z of the ball the camera follows
+            ball_x, ball_y, ball_z, ball_radius, _ = snapshot.balls[player]
+            if ghost_layer is not None and snapshot.started:
+                render_queue.custom(PASS_TRANSLUCENT, ghost_layer.draw,
+                                    position=(ball_x, ball_y, ball_z))
+            if ghost_client is not None:
+                for x, y, z in ghost_client.ghost_positions():
+                    render_queue.sphere(x, y, z, ball_radius, fade(WHITE, 0.35))
+            for state, (_, _, shield, _, _) in zip(snapshot.balls, snapshot.players):
+                draw_ball(render_queue, state, shield, quality)
+            render_queue.flush()
+
+            end_mode_3d()
+            if view_targets:
+                end_texture_mode()
+
+        for target, (x, y, width, height) in zip(view_targets, viewports):
+            # Render textures are stored upside down
+            draw_texture_rec(target.texture, Rectangle(0, 0, width, -height),
+                             Vector2(x, y), WHITE)
+            draw_rectangle_lines(x, y, width, height, DARKGRAY)
+
         # Draw UI
-        if start_message_shown:
-            draw_text("Press SPACE to Start", 
-                     SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2, 20, WHITE)
-            draw_text("Use Arrow Keys to Move, SPACE to Jump", 
-                     SCREEN_WIDTH//2 - 150, SCREEN_HEIGHT//2 + 30, 20, GRAY)
+        if not snapshot.started:
+            render_queue.text("Press SPACE to Start", 
+                             SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2, 20, WHITE)
+            render_queue.text("Use Arrow Keys to Move, SPACE to Jump", 
+                             SCREEN_WIDTH//2 - 150, SCREEN_HEIGHT//2 + 30, 20, GRAY)
         else:
             # Draw HUD
-            draw_text(f"Distance: {int(-ball.position.z)} m", 20, 20, 20, WHITE)
-            draw_text(f"Score: {ball.score}", 20, 50, 20, GOLD)
-            
-            # Draw combo multiplier
-            if game_manager.current_level_data.combo_multiplier > 1:
-                draw_text(
-                    f"Combo: x{game_manager.current_level_data.combo_multiplier:.1f}",
-                    20, 80, 20, PURPLE
-                )
-            
-            # Draw active power-ups
-            y_offset = 110
-            if ball.has_speed_boost:
-                draw_text("Speed Boost!", 20, y_offset, 20, GREEN)
-                y_offset += 30
-            if ball.has_shield:
-                draw_text("Shield Active", 20, y_offset, 20, SKYBLUE)
-                y_offset += 30
-            if ball.has_magnet:
-                draw_text("Magnet Active", 20, y_offset, 20, PURPLE)
+            for player, (x, y, width, _) in enumerate(viewports):
+                draw_player_hud(render_queue, snapshot, player, x, y, width)
+            if snapshot.state == GameState.LEVEL_COMPLETE:
+                render_queue.text(f"Level {snapshot.level_number - 1} complete!",
+                                  SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//3, 24, GREEN)
             
             # Draw achievement notifications
             y_offset = 150
-            for achievement in game_manager.achievements:
-                if achievement.show_time > 0:
-                    draw_text(
-                        f"Achievement Unlocked: {achievement.name}",
-                        SCREEN_WIDTH//2 - 150,
-                        y_offset,
-                        20,
-                        GOLD
-                    )
-                    draw_text(
-                        achievement.description,
-                        SCREEN_WIDTH//2 - 120,
-                        y_offset + 25,
-                        16,
-                        LIGHTGRAY
-                    )
-                    y_offset += 60
+            for name, description in snapshot.achievements_shown:
+                render_queue.text(
+                    f"Achievement Unlocked: {name}",
+                    SCREEN_WIDTH//2 - 150,
+                    y_offset,
+                    20,
+                    GOLD
+                )
+                render_queue.text(
+                    description,
+                    SCREEN_WIDTH//2 - 120,
+                    y_offset + 25,
+                    16,
+                    LIGHTGRAY
+                )
+                y_offset += 60
             
-            if game_manager.state == GameState.GAME_OVER:
-                draw_text("Game Over! Press R to restart", 
-                         SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2, 20, RED)
-                draw_text(f"Final Score: {ball.score}", 
-                         SCREEN_WIDTH//2 - 70, SCREEN_HEIGHT//2 + 30, 20, GOLD)
+            if snapshot.state == GameState.GAME_OVER:
+                final_score = max(score for score, _, _, _, _ in snapshot.players)
+                render_queue.text("Game Over! Press R to restart", 
+                                 SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2, 20, RED)
+                render_queue.text(f"Final Score: {final_score}", 
+                                 SCREEN_WIDTH//2 - 70, SCREEN_HEIGHT//2 + 30, 20, GOLD)
+                render_queue.text(f"High Score: {snapshot.high_score}", 
+                                 SCREEN_WIDTH//2 + 120, SCREEN_HEIGHT//2 + 30, 20, GOLD)
                 
                 # Show unlocked achievements
                 y_offset = SCREEN_HEIGHT//2 + 70
-                draw_text("Achievements Unlocked:", 
-                         SCREEN_WIDTH//2 - 100, y_offset, 20, GOLD)
+                render_queue.text("Achievements Unlocked:", 
+                                 SCREEN_WIDTH//2 - 100, y_offset, 20, GOLD)
                 y_offset += 30
-                for achievement in game_manager.achievements:
-                    if achievement.unlocked:
-                        draw_text(
-                            f"- {achievement.name}",
-                            SCREEN_WIDTH//2 - 80,
-                            y_offset,
-                            16,
-                            WHITE if achievement.unlocked else GRAY
-                        )
-                        y_offset += 25
+                for name in snapshot.achievements_unlocked:
+                    render_queue.text(
+                        f"- {name}",
+                        SCREEN_WIDTH//2 - 80,
+                        y_offset,
+                        16,
+                        WHITE
+                    )
+                    y_offset += 25
         
+        render_queue.flush_overlay()
+
+        # Capture before the recording indicator is drawn
+        frame_capture.capture(frame_number)
+        if frame_capture.active:
+            draw_text(f"REC  dropped: {frame_capture.dropped}",
+                     SCREEN_WIDTH - 220, 20, 20, RED)
+        if show_render_stats:
+            y_offset = SCREEN_HEIGHT - 110
+            for name, (commands, batches) in render_queue.stats().items():
+                draw_text(f"{name}: {commands} commands, {batches} batches",
+                         SCREEN_WIDTH - 320, y_offset, 16, LIGHTGRAY)
+                y_offset += 22
+            draw_text(f"Render: {get_fps()} fps",
+                     SCREEN_WIDTH - 320, SCREEN_HEIGHT - 154, 16, LIGHTGRAY)
+            for line in simulation.report():
+                draw_text(line, SCREEN_WIDTH - 320, SCREEN_HEIGHT - 132, 16, LIGHTGRAY)
+            y_offset = SCREEN_HEIGHT - 176
+            for line in reversed(game_manager.systems.report()):
+                draw_text(line, SCREEN_WIDTH - 320, y_offset, 16, LIGHTGRAY)
+                y_offset -= 22
+            y_offset = SCREEN_HEIGHT - 110
+            draw_text(f"Late input: {'on' if late_input else 'off'} (F4)",
+                     20, y_offset - 22, 16, LIGHTGRAY)
+            for line in input_latency.report():
+                draw_text(line, 20, y_offset, 16, LIGHTGRAY)
+                y_offset += 22
+            y_offset = SCREEN_HEIGHT - 220
+            draw_text(f"Managed GC: {'on' if gc_collector.enabled else 'off'} (F6)",
+                     20, y_offset - 22, 16, LIGHTGRAY)
+            for line in gc_monitor.report():
+                draw_text(line, 20, y_offset, 16, LIGHTGRAY)
+                y_offset += 22
+
+        # Measure work done before end_drawing, which also waits for vsync
+        work_ms = (time.perf_counter() - frame_start) * 1000.0
+        quality_governor.record(work_ms)
+        if playing:
+            telemetry.tick(frame_number, delta_time, work_ms)
+        gc_collector.end_frame(work_ms, quality_governor.budget_ms)
+        frame_number += 1
         end_drawing()
+        input_latency.presented(snapshot.tick)
 
+    simulation.stop()
+    for line in input_latency.report():
+        print(f"Input latency {line}")
+    for line in gc_monitor.report():
+        print(line)
+    gc_collector.disable()
+    gc_monitor.close()
+    telemetry.close()
+    scores.close()
+    replay_archive.close()
+    frame_capture.close()
+    for target in view_targets:
+        unload_render_texture(target)
+    if ghost_layer is not None:
+        ghost_layer.unload()
+    if ghost_client is not None:
+        ghost_client.close()
+    if animation is not None:
+        animation.unload()
     close_window()
 
 if __name__ == "__main__":
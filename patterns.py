@@ -0,0 +1,370 @@
+import pyray
+from bisect import bisect
+from random import random, uniform
+from power_ups import POWER_UPS
+from entities import KIND_OBSTACLE
+import glob
+import hashlib
+import json
+import math
+import os
+import struct
+
+# Obstacle patterns and levels are defined in JSON under data/
+# (data/patterns/*.json, one pattern group per file, and data/levels.json).
+# The first load compiles them into a flat binary cache next to them; the
+# cache header holds a SHA-256 of every source file, so editing any of
+# them recompiles on the next start and otherwise only the cache is read.
+#
+# A pattern is a list of obstacles placed relative to a z position. Every
+# numeric field is a value spec:
+#   2.0                          fixed
+#   [2.0, 4.0]                   uniform in range
+#   {"value" or "range", "per_difficulty": d or [low d, high d],
+#    "per_repeat": r, "max": m, "var": name}
+# "var" adds a pattern variable drawn once per placement (e.g. the shared
+# offset of a gap). An obstacle can repeat every "spacing" units of z, and
+# "mirror" flips x on every other repeat ("repeat") or on every other
+# obstacle spawned by the level ("parity").
+#
+# A level lists its starting obstacles and power-ups (z relative to where
+# the level begins), a "length" after which the next level takes over
+# (0 or absent for endless) and a "difficulty_bonus".
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CACHE_NAME = "patterns.bgpc"
+
+CACHE_MAGIC = b"BGPC"
+CACHE_VERSION = 2
+
+GROUPS = ("row",)
+FIELDS = ("x", "y", "z", "width", "height", "depth",
+          "move_range", "move_speed", "spin_radius", "spin_speed")
+FIELD_DEFAULTS = (0.0, 1.0, 0.0, 2.0, 2.0, 2.0, 0.0, 0.0, 0.0, 0.0)
+
+MIRROR_REPEAT = 1
+MIRROR_PARITY = 2
+SPINNING = 4
+MIRRORS = {"repeat": MIRROR_REPEAT, "parity": MIRROR_PARITY}
+
+NO_VAR = -1
+
+HEADER = struct.Struct("<4sHH32sHHH")
+NAME = struct.Struct("<B")
+PATTERN = struct.Struct("<HBfBB")
+# low, high, low per difficulty, high per difficulty, per repeat, max, var
+VALUE = struct.Struct("<6fb")
+# repeat, spacing, flags, color, moving chance, then one value per field
+OBSTACLE = struct.Struct("<BfB4Bf" + "6fb" * len(FIELDS))
+# obstacle count, power-up count, length (0 for endless), difficulty bonus
+LEVEL = struct.Struct("<HHff")
+POWER_UP = struct.Struct("<3fH")
+
+class PatternError(Exception):
+    pass
+
+class Pattern:
+    __slots__ = ("name", "group", "weight", "vars", "data", "offset", "count", "decoded")
+
+    def __init__(self, name, group, weight, vars, data, offset, count):
+        self.name = name
+        self.group = group
+        self.weight = weight
+        self.vars = vars  # Value tuples, drawn once per placement
+        # Obstacle records stay in the cache buffer until first placed
+        self.data = data
+        self.offset = offset
+        self.count = count
+        self.decoded = None
+
+    @property
+    def obstacles(self):
+        # (repeat, spacing, flags, color, moving chance, values) per obstacle
+        if self.decoded is None:
+            self.decoded = _read_obstacles(self.data, self.offset, self.count)
+            self.data = None
+        return self.decoded
+
+class PatternGroup:
+    def __init__(self, patterns):
+        self.patterns = patterns
+        # Running weight totals, so a weighted pick is one bisect however
+        # many patterns there are
+        self.cumulative = []
+        total = 0.0
+        for pattern in patterns:
+            total += pattern.weight
+            self.cumulative.append(total)
+        self.total = total
+
+    def choose(self):
+        index = bisect(self.cumulative, random() * self.total)
+        return self.patterns[min(index, len(self.patterns) - 1)]
+
+class PatternLibrary:
+    def __init__(self, patterns, levels, digest):
+        self.patterns = {pattern.name: pattern for pattern in patterns}
+        self.groups = {
+            group: PatternGroup([p for p in patterns if p.group == group])
+            for group in GROUPS
+        }
+        # (obstacles, power-ups (x, y, z, type), length, difficulty bonus) per level
+        self.levels = levels
+        self.digest = digest
+
+    def choose(self, group):
+        return self.groups[group].choose()
+
+def spawn_pattern(level, pattern, z):
+    # Places one instance of the pattern at z; returns the obstacle count
+    vars = [_draw(spec, level.difficulty, 0, ()) for spec in pattern.vars]
+    return spawn_obstacles(level, pattern.obstacles, z, vars)
+
+def spawn_obstacles(level, obstacles, z, vars=()):
+    difficulty = level.difficulty
+    spawned = 0
+    for repeat, spacing, flags, color, moving_chance, values in obstacles:
+        for i in range(repeat):
+            x, y, dz, width, height, depth, move_range, move_speed, spin_radius, spin_speed = (
+                _draw(spec, difficulty, i, vars) for spec in values
+            )
+            if flags & MIRROR_REPEAT and i % 2 == 1:
+                x = -x
+            elif flags & MIRROR_PARITY and level.store.count(KIND_OBSTACLE) % 2 == 0:
+                x = -x
+            level.spawn_obstacle(
+                x, y, z + dz + i * spacing,
+                width, height, depth,
+                color,
+                moving=moving_chance >= 1.0 or (moving_chance > 0.0 and random() < moving_chance),
+                move_range=move_range,
+                move_speed=move_speed,
+                spinning=bool(flags & SPINNING),
+                spin_radius=spin_radius,
+                spin_speed=spin_speed
+            )
+            spawned += 1
+    return spawned
+
+def _draw(spec, difficulty, repeat, vars):
+    low, high, low_per_difficulty, high_per_difficulty, per_repeat, limit, var = spec
+    low += low_per_difficulty * difficulty
+    high += high_per_difficulty * difficulty
+    value = uniform(low, high) if high > low else low
+    value += per_repeat * repeat
+    if var != NO_VAR:
+        value += vars[var]
+    return min(value, limit)
+
+def source_paths(directory=DATA_DIRECTORY):
+    return sorted(glob.glob(os.path.join(directory, "patterns", "*.json"))) + [
+        os.path.join(directory, "levels.json")
+    ]
+
+def load_library(directory=DATA_DIRECTORY):
+    # Reads the cache when it matches the sources, otherwise recompiles it
+    sources = []
+    digest = hashlib.sha256(struct.pack("<H", CACHE_VERSION))
+    for path in source_paths(directory):
+        with open(path, "rb") as f:
+            data = f.read()
+        sources.append((path, data))
+        digest.update(os.path.relpath(path, directory).encode())
+        digest.update(struct.pack("<Q", len(data)))
+        digest.update(data)
+    digest = digest.digest()
+
+    cache_path = os.path.join(directory, CACHE_NAME)
+    try:
+        with open(cache_path, "rb") as f:
+            return read_library(f.read(), digest)
+    except (OSError, PatternError, struct.error):
+        pass
+
+    data = compile_library(sources, digest)
+    try:
+        # Write then rename so a crash mid-write never leaves a torn cache
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # Read-only install: keep using the freshly compiled copy
+    return read_library(data, digest)
+
+def compile_library(sources, digest):
+    names = []
+    name_index = {}
+
+    def intern(name):
+        if name not in name_index:
+            encoded = name.encode()
+            if len(encoded) > 255:
+                raise PatternError(f"name too long: {name}")
+            name_index[name] = len(names)
+            names.append(encoded)
+        return name_index[name]
+
+    patterns = []
+    levels = []
+    seen = set()
+    for path, data in sources:
+        try:
+            document = json.loads(data)
+        except ValueError as e:
+            raise PatternError(f"{path}: {e}") from None
+        if os.path.basename(path) == "levels.json":
+            for index, level in enumerate(document["levels"]):
+                where = f"{path}: level {index + 1}"
+                obstacles = [_compile_obstacle(o, {}, where) for o in level.get("obstacles", ())]
+                power_ups = []
+                for power_up in level.get("power_ups", ()):
+                    if power_up["type"] not in POWER_UPS:
+                        raise PatternError(f"{where}: unknown power-up {power_up['type']}")
+                    power_ups.append(POWER_UP.pack(
+                        power_up["x"], power_up.get("y", 1.0), power_up["z"],
+                        intern(power_up["type"])
+                    ))
+                levels.append((obstacles, power_ups, level.get("length", 0.0),
+                               level.get("difficulty_bonus", 0.0)))
+            continue
+
+        group = document.get("group")
+        if group not in GROUPS:
+            raise PatternError(f"{path}: unknown group {group}")
+        for pattern in document["patterns"]:
+            name = pattern["name"]
+            where = f"{path}: {name}"
+            if name in seen:
+                raise PatternError(f"{where}: duplicate pattern name")
+            seen.add(name)
+            var_names = list(pattern.get("vars", {}))
+            var_index = {var: index for index, var in enumerate(var_names)}
+            vars = [_compile_value(pattern["vars"][var], {}, where) for var in var_names]
+            obstacles = [_compile_obstacle(o, var_index, where) for o in pattern["obstacles"]]
+            if len(vars) > 255 or len(obstacles) > 255:
+                raise PatternError(f"{where}: too many vars or obstacles")
+            patterns.append((
+                PATTERN.pack(intern(name), GROUPS.index(group), pattern.get("weight", 1.0),
+                             len(vars), len(obstacles)),
+                vars, obstacles
+            ))
+
+    out = [HEADER.pack(CACHE_MAGIC, CACHE_VERSION, 0, digest,
+                       len(names), len(patterns), len(levels))]
+    for name in names:
+        out.append(NAME.pack(len(name)))
+        out.append(name)
+    for record, vars, obstacles in patterns:
+        out.append(record)
+        out.extend(vars)
+        out.extend(obstacles)
+    for obstacles, power_ups, length, difficulty_bonus in levels:
+        out.append(LEVEL.pack(len(obstacles), len(power_ups), length, difficulty_bonus))
+        out.extend(obstacles)
+        out.extend(power_ups)
+    return b"".join(out)
+
+def _compile_value(spec, var_index, where):
+    low_per_difficulty = high_per_difficulty = per_repeat = 0.0
+    limit = math.inf
+    var = NO_VAR
+    if isinstance(spec, (int, float)):
+        low = high = spec
+    elif isinstance(spec, list):
+        low, high = spec
+    elif isinstance(spec, dict):
+        if "range" in spec:
+            low, high = spec["range"]
+        else:
+            low = high = spec.get("value", 0.0)
+        per_difficulty = spec.get("per_difficulty", 0.0)
+        if isinstance(per_difficulty, list):
+            low_per_difficulty, high_per_difficulty = per_difficulty
+        else:
+            low_per_difficulty = high_per_difficulty = per_difficulty
+        per_repeat = spec.get("per_repeat", 0.0)
+        limit = spec.get("max", math.inf)
+        if "var" in spec:
+            if spec["var"] not in var_index:
+                raise PatternError(f"{where}: unknown var {spec['var']}")
+            var = var_index[spec["var"]]
+    else:
+        raise PatternError(f"{where}: bad value {spec!r}")
+    return VALUE.pack(low, high, low_per_difficulty, high_per_difficulty, per_repeat, limit, var)
+
+def _compile_obstacle(obstacle, var_index, where):
+    unknown = set(obstacle) - set(FIELDS) - {"repeat", "spacing", "mirror", "color", "moving", "spinning"}
+    if unknown:
+        raise PatternError(f"{where}: unknown fields {sorted(unknown)}")
+    color = obstacle.get("color", "GRAY")
+    if isinstance(color, str):
+        color = getattr(pyray, color, None)
+        if not isinstance(color, tuple):
+            raise PatternError(f"{where}: unknown color {obstacle['color']}")
+    flags = 0
+    if "mirror" in obstacle:
+        if obstacle["mirror"] not in MIRRORS:
+            raise PatternError(f"{where}: bad mirror {obstacle['mirror']}")
+        flags |= MIRRORS[obstacle["mirror"]]
+    if obstacle.get("spinning", False):
+        flags |= SPINNING
+    moving = obstacle.get("moving", False)
+    values = b"".join(
+        _compile_value(obstacle.get(field, default), var_index, where)
+        for field, default in zip(FIELDS, FIELD_DEFAULTS)
+    )
+    return struct.pack("<BfB4Bf", obstacle.get("repeat", 1), obstacle.get("spacing", 0.0),
+                       flags, *color, float(moving)) + values
+
+def read_library(data, digest=None):
+    magic, version, _, stored_digest, name_count, pattern_count, level_count = (
+        HEADER.unpack_from(data, 0)
+    )
+    if magic != CACHE_MAGIC:
+        raise PatternError("not a pattern cache")
+    if version != CACHE_VERSION:
+        raise PatternError(f"unsupported pattern cache version {version}")
+    if digest is not None and stored_digest != digest:
+        raise PatternError("pattern cache is stale")
+    offset = HEADER.size
+
+    names = []
+    for _ in range(name_count):
+        (length,) = NAME.unpack_from(data, offset)
+        offset += NAME.size
+        names.append(data[offset:offset + length].decode())
+        offset += length
+
+    patterns = []
+    for _ in range(pattern_count):
+        name, group, weight, var_count, obstacle_count = PATTERN.unpack_from(data, offset)
+        offset += PATTERN.size
+        vars = tuple(VALUE.unpack_from(data, offset + i * VALUE.size) for i in range(var_count))
+        offset += var_count * VALUE.size
+        patterns.append(Pattern(names[name], GROUPS[group], weight, vars,
+                                data, offset, obstacle_count))
+        offset += obstacle_count * OBSTACLE.size
+
+    levels = []
+    for _ in range(level_count):
+        obstacle_count, power_up_count, length, difficulty_bonus = LEVEL.unpack_from(data, offset)
+        offset += LEVEL.size
+        obstacles = _read_obstacles(data, offset, obstacle_count)
+        offset += obstacle_count * OBSTACLE.size
+        power_ups = []
+        for _ in range(power_up_count):
+            x, y, z, type = POWER_UP.unpack_from(data, offset)
+            offset += POWER_UP.size
+            power_ups.append((x, y, z, names[type]))
+        levels.append((obstacles, tuple(power_ups), length, difficulty_bonus))
+    if offset != len(data):
+        raise PatternError("pattern cache is truncated")
+
+    return PatternLibrary(patterns, levels, stored_digest)
+
+def _read_obstacles(data, offset, count):
+    obstacles = []
+    for record in OBSTACLE.iter_unpack(data[offset:offset + count * OBSTACLE.size]):
+        values = tuple(record[i:i + 7] for i in range(8, len(record), 7))
+        obstacles.append((record[0], record[1], record[2], record[3:7], record[7], values))
+    return tuple(obstacles)
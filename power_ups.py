@@ -0,0 +1,36 @@
+from pyray import *
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# Every power-up type in one table. Timed power-ups switch a Ball flag on
+# for their duration; instant ones only run their effect. The table order
+# is also the type code used by snapshots and telemetry, so only append.
+@dataclass(frozen=True)
+class PowerUpType:
+    name: str
+    color: tuple
+    spawn_weight: float
+    duration: float = 0.0               # 0 for instant power-ups
+    flag: Optional[str] = None          # Ball attribute set while active
+    score: int = 0
+    on_apply: Optional[Callable] = None
+    on_expire: Optional[Callable] = None
+
+def count_speed_boost(ball):
+    ball.speed_boost_count += 1
+
+def reset_speed_boost_count(ball):
+    ball.speed_boost_count = 0  # Reset count when speed boost expires
+
+POWER_UP_TYPES = [
+    PowerUpType("speed_boost", GOLD, 0.3, duration=5.0, flag="has_speed_boost",
+                on_apply=count_speed_boost, on_expire=reset_speed_boost_count),
+    PowerUpType("shield", SKYBLUE, 0.25, duration=10.0, flag="has_shield"),
+    PowerUpType("points", GREEN, 0.25, score=1000),
+    PowerUpType("magnet", PURPLE, 0.2, duration=8.0, flag="has_magnet"),
+]
+
+POWER_UPS = {power_up.name: power_up for power_up in POWER_UP_TYPES}
+POWER_UP_NAMES = tuple(power_up.name for power_up in POWER_UP_TYPES)
+POWER_UP_INDEX = {name: index for index, name in enumerate(POWER_UP_NAMES)}
+TIMED_POWER_UPS = tuple(power_up.name for power_up in POWER_UP_TYPES if power_up.duration > 0)
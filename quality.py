@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from collections import deque
+import time
+
+FRAME_BUDGET_MS = 1000.0 / 60.0
+
+@dataclass(frozen=True)
+class QualitySettings:
+    name: str
+    particle_scale: float      # Fraction of particles spawned per effect
+    trail_length: int          # Spheres in the ball trail
+    glow_passes: int           # Extra translucent glow passes per object
+    draw_distance: float       # How far ahead of the ball things are drawn
+    road_look_ahead: float     # How far ahead road segments are generated
+
+# Ordered from best to cheapest; the governor only ever moves one step at a time
+QUALITY_TIERS = [
+    QualitySettings("high", 1.0, 15, 1, 800.0, 800.0),
+    QualitySettings("medium", 0.6, 10, 1, 500.0, 600.0),
+    QualitySettings("low", 0.35, 6, 0, 300.0, 400.0),
+    QualitySettings("minimal", 0.15, 3, 0, 200.0, 300.0),
+]
+
+@dataclass
+class QualityDecision:
+    frame: int
+    from_tier: int
+    to_tier: int
+    average_ms: float
+    timestamp: float
+
+class QualityGovernor:
+    def __init__(self, budget_ms=FRAME_BUDGET_MS, window=60,
+                 downgrade_ratio=1.0, upgrade_ratio=0.7,
+                 downgrade_frames=30, upgrade_frames=180,
+                 min_tier=0, max_tier=len(QUALITY_TIERS) - 1):
+        self.budget_ms = budget_ms
+        self.frame_times = deque(maxlen=window)
+        self.frame_time_sum = 0.0
+        # Hysteresis band: drop a tier when the rolling average sits above
+        # budget * downgrade_ratio, only climb back when it has stayed well
+        # below budget * upgrade_ratio for much longer
+        self.downgrade_ratio = downgrade_ratio
+        self.upgrade_ratio = upgrade_ratio
+        self.downgrade_frames = downgrade_frames
+        self.upgrade_frames = upgrade_frames
+        self.min_tier = min_tier
+        self.max_tier = max_tier
+        self.tier = min_tier
+        self.over_budget_frames = 0
+        self.under_budget_frames = 0
+        self.frame_count = 0
+        self.decisions = deque(maxlen=256)
+        self.listeners = []
+
+    @property
+    def settings(self):
+        return QUALITY_TIERS[self.tier]
+
+    @property
+    def average_ms(self):
+        if not self.frame_times:
+            return 0.0
+        return self.frame_time_sum / len(self.frame_times)
+
+    def add_listener(self, callback):
+        # callback(decision, settings) is called on every tier change
+        self.listeners.append(callback)
+
+    def record(self, frame_ms):
+        self.frame_count += 1
+        if len(self.frame_times) == self.frame_times.maxlen:
+            self.frame_time_sum -= self.frame_times[0]
+        self.frame_times.append(frame_ms)
+        self.frame_time_sum += frame_ms
+
+        # Wait for a full window before making any decision
+        if len(self.frame_times) < self.frame_times.maxlen:
+            return self.settings
+
+        average = self.average_ms
+        if average > self.budget_ms * self.downgrade_ratio:
+            self.over_budget_frames += 1
+            self.under_budget_frames = 0
+        elif average < self.budget_ms * self.upgrade_ratio:
+            self.under_budget_frames += 1
+            self.over_budget_frames = 0
+        else:
+            self.over_budget_frames = 0
+            self.under_budget_frames = 0
+
+        if self.over_budget_frames >= self.downgrade_frames and self.tier < self.max_tier:
+            self.set_tier(self.tier + 1)
+        elif self.under_budget_frames >= self.upgrade_frames and self.tier > self.min_tier:
+            self.set_tier(self.tier - 1)
+
+        return self.settings
+
+    def set_tier(self, tier):
+        tier = max(self.min_tier, min(self.max_tier, tier))
+        if tier == self.tier:
+            return
+        decision = QualityDecision(
+            self.frame_count, self.tier, tier, self.average_ms, time.time()
+        )
+        self.tier = tier
+        self.decisions.append(decision)
+        # Start measuring the new tier from scratch so it isn't judged by
+        # frames rendered at the old one
+        self.frame_times.clear()
+        self.frame_time_sum = 0.0
+        self.over_budget_frames = 0
+        self.under_budget_frames = 0
+        for listener in self.listeners:
+            listener(decision, self.settings)
+
+    def status(self):
+        return {
+            "tier": self.tier,
+            "name": self.settings.name,
+            "average_ms": self.average_ms,
+            "budget_ms": self.budget_ms,
+            "frame": self.frame_count,
+            "decisions": len(self.decisions),
+        }
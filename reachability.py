@@ -0,0 +1,151 @@
+from entities import MOTION_NONE, MOTION_OSCILLATE
+import math
+
+# Solvability check for generated obstacles. The ball's movement envelope
+# (how far it can move sideways in a given forward distance, and which
+# obstacles it can jump clean over) is precomputed once from the Ball's
+# constants. Checking a row of obstacles is then just interval arithmetic:
+# the set of lateral positions the ball can be in is carried from row to
+# row, widened by the lateral reach and cut down by the row's blockers.
+# Obstacles are EntityStore.shapes() rows:
+# (x, y, z, width, height, depth, motion, origin_x, amplitude).
+STEP = 1.0 / 60.0  # Simulation step used to build the tables
+MAX_REACH_TIME = 2.0  # Past this the ball can cross the whole road anyway
+HEIGHT_STEP = 0.05  # Resolution of the jump table
+PHASE_SAMPLES = 8  # Phases checked for moving obstacles
+
+# Oscillation offsets (as a fraction of the range) at the sampled phases
+PHASE_OFFSETS = tuple(math.sin(2.0 * math.pi * k / PHASE_SAMPLES) for k in range(PHASE_SAMPLES))
+
+class MovementEnvelope:
+    def __init__(self, ball):
+        self.radius = ball.radius
+        self.half_width = ball.road_half_width - ball.radius  # Centre stays inside this
+        # Worst cases: least time to steer at boosted speed, shortest jump at base speed
+        self.fast_speed = ball.forward_speed * 1.5
+        self.slow_speed = ball.forward_speed
+
+        # reach[i]: sideways distance covered from rest in i steps of full steering
+        self.reach = [0.0]
+        x = 0.0
+        velocity = 0.0
+        for _ in range(int(MAX_REACH_TIME / STEP)):
+            velocity += (ball.max_side_speed - velocity) * ball.side_acceleration * STEP
+            velocity -= min(velocity, ball.side_drag * STEP)
+            x += velocity * STEP
+            self.reach.append(x)
+
+        # clear_depth[i]: longest obstacle (in z, ball included) the ball can
+        # jump clean over when the obstacle top is i * HEIGHT_STEP above ground
+        self.clear_depth = []
+        a = ball.gravity / 2.0
+        b = ball.jump_speed
+        height = 0.0
+        while True:
+            discriminant = b * b - 4.0 * a * height
+            if discriminant <= 0.0:
+                break
+            airtime = math.sqrt(discriminant) / a
+            self.clear_depth.append(airtime * self.slow_speed - 2.0 * self.radius)
+            height += HEIGHT_STEP
+
+    def lateral_reach(self, distance):
+        steps = int(distance / self.fast_speed / STEP)
+        if steps >= len(self.reach):
+            return self.half_width * 2.0
+        return self.reach[steps]
+
+    def jumpable(self, obstacle):
+        _, y, _, _, height, depth, _, _, _ = obstacle
+        index = int(math.ceil((y + height / 2.0) / HEIGHT_STEP))
+        return index < len(self.clear_depth) and depth <= self.clear_depth[index]
+
+    def full_road(self):
+        return [(-self.half_width, self.half_width)]
+
+    def free_intervals(self, blockers, phase):
+        # Ball-centre positions clear of every blocker at one phase
+        blocked = []
+        for x, _, _, width, _, _, motion, origin_x, amplitude in blockers:
+            if motion == MOTION_OSCILLATE:
+                x = origin_x + amplitude * PHASE_OFFSETS[phase]
+            elif motion != MOTION_NONE:
+                # Spinning: cos is sin a quarter turn on
+                x = origin_x + amplitude * PHASE_OFFSETS[(phase + PHASE_SAMPLES // 4) % PHASE_SAMPLES]
+            extent = width / 2.0 + self.radius
+            blocked.append((x - extent, x + extent))
+        blocked.sort()
+        free = []
+        start = -self.half_width
+        for low, high in blocked:
+            if low > start:
+                free.append((start, min(low, self.half_width)))
+            start = max(start, high)
+            if start >= self.half_width:
+                break
+        if start < self.half_width:
+            free.append((start, self.half_width))
+        return [(low, high) for low, high in free if high > low]
+
+    def pass_row(self, feasible, distance, blockers):
+        # Returns the positions the ball can be in after the row, or None if
+        # some phase of the row's moving obstacles leaves no way through
+        reach = self.lateral_reach(distance)
+        reachable = _merge([
+            (max(-self.half_width, low - reach), min(self.half_width, high + reach))
+            for low, high in feasible
+        ])
+        if not blockers:
+            return reachable
+        phases = PHASE_SAMPLES if any(o[6] != MOTION_NONE for o in blockers) else 1
+        after = []
+        for phase in range(phases):
+            through = _intersect(reachable, self.free_intervals(blockers, phase))
+            if not through:
+                return None
+            after.extend(through)
+        return _merge(after)
+
+    def check(self, feasible, feasible_z, obstacles):
+        # Walks obstacles (any order) as rows in travel order; returns the
+        # (feasible, z) state after the last row, or None if unsolvable
+        rows = []
+        for obstacle in sorted(obstacles, key=lambda o: abs(o[2] - feasible_z)):
+            z, depth = obstacle[2], obstacle[5]
+            if rows and abs(z - rows[-1][0]) < (depth + rows[-1][1]) / 2.0 + self.radius * 2.0:
+                rows[-1][2].append(obstacle)
+                rows[-1][1] = max(rows[-1][1], depth)
+            else:
+                rows.append([z, depth, [obstacle]])
+        for z, _, row in rows:
+            blockers = [o for o in row if not self.jumpable(o)]
+            feasible = self.pass_row(feasible, abs(z - feasible_z), blockers)
+            if feasible is None:
+                return None
+            feasible_z = z
+        return feasible, feasible_z
+
+def _merge(intervals):
+    intervals.sort()
+    merged = []
+    for low, high in intervals:
+        if merged and low <= merged[-1][1]:
+            if high > merged[-1][1]:
+                merged[-1] = (merged[-1][0], high)
+        else:
+            merged.append((low, high))
+    return merged
+
+def _intersect(a, b):
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        low = max(a[i][0], b[j][0])
+        high = min(a[i][1], b[j][1])
+        if low < high:
+            result.append((low, high))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
@@ -0,0 +1,135 @@
+from pyray import *
+
+# Deferred draw list for one frame. Subsystems submit commands instead of
+# calling raylib directly; flush() then draws them pass by pass:
+#   opaque      - sorted by material, then front to back
+#   shaded      - mesh draws with their own shader (custom callbacks)
+#   translucent - sorted back to front, drawn once with depth writes off
+#   overlay     - 2D HUD, in submission order
+# Grouping by material keeps the immediate-mode batch from being split by
+# state changes, and the meshes are drawn after a single batch flush.
+# A frame can hold several 3D views (split screen): begin() starts each
+# view's passes, while the overlay and the per-pass stats cover the frame.
+PASS_OPAQUE = 0
+PASS_SHADED = 1
+PASS_TRANSLUCENT = 2
+PASS_OVERLAY = 3
+PASS_NAMES = ("opaque", "shaded", "translucent", "overlay")
+
+MATERIAL_CUBE = 0
+MATERIAL_SPHERE = 1
+MATERIAL_CUSTOM = 2
+MATERIAL_TEXT = 3
+
+def _alpha(color):
+    # Colors are plain tuples or cffi Color structs (from fade/Color)
+    return color[3] if isinstance(color, tuple) else color.a
+
+class RenderQueue:
+    def __init__(self):
+        self.passes = ([], [], [], [])
+        self.camera_x = 0.0
+        self.camera_y = 0.0
+        self.camera_z = 0.0
+        self.sequence = 0  # Keeps equal keys in submission order
+        self.counts = [0, 0, 0, 0]  # Commands drawn last frame, per pass
+        self.batches = [0, 0, 0, 0]  # Material runs drawn last frame, per pass
+        self.frame_counts = [0, 0, 0, 0]  # Running totals for the current frame
+        self.frame_batches = [0, 0, 0, 0]
+
+    def begin_frame(self):
+        self.passes[PASS_OVERLAY].clear()
+        self.counts, self.frame_counts = self.frame_counts, [0, 0, 0, 0]
+        self.batches, self.frame_batches = self.frame_batches, [0, 0, 0, 0]
+
+    def begin(self, camera):
+        for commands in self.passes[:PASS_OVERLAY]:
+            commands.clear()
+        self.camera_x = camera.position.x
+        self.camera_y = camera.position.y
+        self.camera_z = camera.position.z
+        self.sequence = 0
+
+    def depth(self, x, y, z):
+        dx = x - self.camera_x
+        dy = y - self.camera_y
+        dz = z - self.camera_z
+        return dx * dx + dy * dy + dz * dz
+
+    def submit(self, color, material, x, y, z, args):
+        self.sequence += 1
+        depth = self.depth(x, y, z)
+        if _alpha(color) < 255:
+            self.passes[PASS_TRANSLUCENT].append((-depth, self.sequence, material, args))
+        else:
+            self.passes[PASS_OPAQUE].append((material, depth, self.sequence, args))
+
+    def cube(self, x, y, z, width, height, depth, color):
+        self.submit(color, MATERIAL_CUBE, x, y, z, ((x, y, z), width, height, depth, color))
+
+    def sphere(self, x, y, z, radius, color):
+        self.submit(color, MATERIAL_SPHERE, x, y, z, ((x, y, z), radius, color))
+
+    def custom(self, render_pass, callback, *args, position=None):
+        # Mesh and shader draws that raylib cannot batch; position orders
+        # them among other translucent commands
+        self.sequence += 1
+        depth = self.depth(*position) if position is not None else 0.0
+        if render_pass == PASS_TRANSLUCENT:
+            key = (-depth, self.sequence, MATERIAL_CUSTOM, (callback, args))
+        else:
+            key = (MATERIAL_CUSTOM, depth, self.sequence, (callback, args))
+        self.passes[render_pass].append(key)
+
+    def text(self, text, x, y, size, color):
+        self.sequence += 1
+        self.passes[PASS_OVERLAY].append((MATERIAL_TEXT, self.sequence, MATERIAL_TEXT,
+                                          (text, x, y, size, color)))
+
+    def flush(self):
+        # Call inside begin_mode_3d
+        opaque = self.passes[PASS_OPAQUE]
+        opaque.sort()
+        self.draw_commands(PASS_OPAQUE, opaque, 0)
+
+        shaded = self.passes[PASS_SHADED]
+        shaded.sort()
+        self.draw_commands(PASS_SHADED, shaded, 0)
+
+        translucent = self.passes[PASS_TRANSLUCENT]
+        translucent.sort()
+        rl_draw_render_batch_active()
+        rl_disable_depth_mask()
+        self.draw_commands(PASS_TRANSLUCENT, translucent, 2)
+        rl_draw_render_batch_active()
+        rl_enable_depth_mask()
+
+    def flush_overlay(self):
+        # Call after end_mode_3d
+        self.draw_commands(PASS_OVERLAY, self.passes[PASS_OVERLAY], 2)
+
+    def draw_commands(self, render_pass, commands, material_index):
+        batches = 0
+        material = None
+        for command in commands:
+            if command[material_index] != material:
+                material = command[material_index]
+                batches += 1
+                if material == MATERIAL_CUSTOM:
+                    rl_draw_render_batch_active()
+            args = command[3]
+            if material == MATERIAL_CUBE:
+                draw_cube(*args)
+            elif material == MATERIAL_SPHERE:
+                draw_sphere(*args)
+            elif material == MATERIAL_TEXT:
+                draw_text(*args)
+            else:
+                callback, callback_args = args
+                callback(*callback_args)
+        self.frame_counts[render_pass] += len(commands)
+        self.frame_batches[render_pass] += batches
+
+    def stats(self):
+        return {name: (self.counts[index], self.batches[index])
+                for index, name in enumerate(PASS_NAMES)}
@@ -0,0 +1,320 @@
+from concurrent.futures import ThreadPoolExecutor
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from encoding import quantise_state, dequantise_state, write_varint, read_varint
+
+# Replays store the RNG seed, per-tick inputs and frame times, quantised
+# per-tick deltas of the ball (and score), plus a full game-state snapshot
+# every keyframe_interval ticks. Any tick can be reached by jumping to the
+# keyframe before it and decoding at most keyframe_interval small records.
+#
+# Replay blob layout:
+#   header | track header | keyframe table | tick stream | keyframe snapshots | track
+# Tick record: u8 input mask, varint frame time (us), 6 varint ball deltas,
+# varint score delta.
+#
+# Version 2 adds the track: fixed-width (run time, x, y, z) samples every
+# TRACK_INTERVAL ticks that can be read straight out of the archive as an
+# array, for drawing replays as ghosts without decoding the tick stream.
+#
+# A run resumed from a checkpoint keeps the RNG state restored with it, so
+# it has no seed; its tick-0 keyframe, which holds that state, is where
+# resimulation starts.
+REPLAY_MAGIC = b"BGRP"
+REPLAY_VERSION = 2
+DEFAULT_KEYFRAME_INTERVAL = 300
+TRACK_INTERVAL = 6
+RESUMED_SEED = 0
+
+REPLAY_HEADER = struct.Struct("<4sHHQIIIIIq")
+TRACK_HEADER = struct.Struct("<II")
+KEYFRAME_ENTRY = struct.Struct("<IIII6iq")
+TRACK_SAMPLE = struct.Struct("<f3i")
+
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+
+# Archive layout: header | replay blobs and index regions, in append order
+# The index lives in a region with room for `capacity` entries. An append
+# writes the blob at the end of the file and its entry into the first free
+# slot, neither of which the header covers yet, and only then bumps the
+# count in the header, so a crash mid-append leaves the previous archive
+# intact. A full region is copied once into one twice the size after the
+# new blob: copying stays amortised O(1) per append, and the abandoned
+# regions never add up to more than the live one. Archives written before
+# capacity was stored have 0 there, meaning a region exactly count long.
+ARCHIVE_MAGIC = b"BGRA"
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct("<4sHHQII8x")
+INDEX_ENTRY = struct.Struct("<QQQIIdq")
+INDEX_CHUNK = 64  # Entries in the first index region
+
+class ReplayError(Exception):
+    pass
+
+class ReplayRecorder:
+    def __init__(self, seed, ball, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, start_time=0.0):
+        self.seed = seed
+        self.keyframe_interval = keyframe_interval
+        self.tick = 0
+        self.stream = bytearray()
+        self.keyframes = []
+        self.last_state = quantise_state(ball.position, ball.velocity)
+        self.last_score = ball.score
+        self.elapsed = start_time  # Run time, nonzero when resumed from a checkpoint
+        self.track = bytearray(TRACK_SAMPLE.pack(start_time, *self.last_state[:3]))
+
+    def needs_keyframe(self):
+        return self.tick % self.keyframe_interval == 0
+
+    def add_keyframe(self, snapshot):
+        # Taken before the tick is simulated; stores where decoding resumes
+        self.keyframes.append(
+            (self.tick, len(self.stream), snapshot, self.last_state, self.last_score)
+        )
+
+    def record_tick(self, inputs, delta_time, ball):
+        stream = self.stream
+        stream.append(inputs)
+        write_varint(stream, int(round(delta_time * 1e6)))
+        state = quantise_state(ball.position, ball.velocity)
+        last_state = self.last_state
+        for field in range(6):
+            write_varint(stream, state[field] - last_state[field])
+        write_varint(stream, ball.score - self.last_score)
+        self.last_state = state
+        self.last_score = ball.score
+        self.elapsed += delta_time
+        self.tick += 1
+        if self.tick % TRACK_INTERVAL == 0:
+            self.track += TRACK_SAMPLE.pack(self.elapsed, *state[:3])
+
+    def finish(self, score):
+        if self.tick % TRACK_INTERVAL:
+            self.track += TRACK_SAMPLE.pack(self.elapsed, *self.last_state[:3])
+
+        table_offset = REPLAY_HEADER.size + TRACK_HEADER.size
+        stream_offset = table_offset + KEYFRAME_ENTRY.size * len(self.keyframes)
+        snapshot_offset = stream_offset + len(self.stream)
+
+        table = bytearray()
+        snapshots = []
+        for tick, offset, snapshot, state, last_score in self.keyframes:
+            table += KEYFRAME_ENTRY.pack(tick, offset, snapshot_offset, len(snapshot),
+                                         *state, last_score)
+            snapshots.append(snapshot)
+            snapshot_offset += len(snapshot)
+        track_offset = snapshot_offset
+
+        header = REPLAY_HEADER.pack(
+            REPLAY_MAGIC, REPLAY_VERSION, self.keyframe_interval, self.seed,
+            self.tick, len(self.keyframes), table_offset, stream_offset,
+            len(self.stream), score
+        )
+        track_header = TRACK_HEADER.pack(track_offset, len(self.track) // TRACK_SAMPLE.size)
+        return b"".join([header, track_header, table, self.stream] + snapshots + [self.track])
+
+class ReplayView:
+    # Reads a replay in place from any buffer (usually a slice of the mmap)
+    def __init__(self, data):
+        self.data = memoryview(data)
+        try:
+            (magic, version, self.keyframe_interval, self.seed, self.tick_count,
+             self.keyframe_count, self.table_offset, self.stream_offset,
+             self.stream_length, self.score) = REPLAY_HEADER.unpack_from(self.data, 0)
+        except struct.error as e:
+            raise ReplayError("Truncated replay header") from e
+        if magic != REPLAY_MAGIC:
+            raise ReplayError("Not a replay")
+        if not 1 <= version <= REPLAY_VERSION:
+            raise ReplayError(f"Unsupported replay version {version}")
+        if version >= 2:
+            try:
+                self.track_offset, self.track_count = TRACK_HEADER.unpack_from(
+                    self.data, REPLAY_HEADER.size
+                )
+            except struct.error as e:
+                raise ReplayError("Truncated replay header") from e
+        else:
+            self.track_offset, self.track_count = 0, 0
+
+        # Every section has to lie inside the blob
+        size = len(self.data)
+        if (self.table_offset + self.keyframe_count * KEYFRAME_ENTRY.size > size or
+                self.stream_offset + self.stream_length > size or
+                self.track_offset + self.track_count * TRACK_SAMPLE.size > size):
+            raise ReplayError("Replay sections run past the end of the data")
+
+    def track_bytes(self):
+        # Raw TRACK_SAMPLE records, still backed by the underlying buffer
+        end = self.track_offset + self.track_count * TRACK_SAMPLE.size
+        return self.data[self.track_offset:end]
+
+    def keyframe(self, index):
+        return KEYFRAME_ENTRY.unpack_from(
+            self.data, self.table_offset + index * KEYFRAME_ENTRY.size
+        )
+
+    def keyframe_index_for(self, tick):
+        # Last keyframe at or before tick
+        index = bisect.bisect_right(_KeyframeTicks(self), tick) - 1
+        if index < 0:
+            raise ReplayError("Replay has no keyframe before tick")
+        return index
+
+    def keyframe_snapshot(self, index):
+        entry = self.keyframe(index)
+        return entry[0], bytes(self.data[entry[2]:entry[2] + entry[3]])
+
+    def decode(self, start_index, end_tick):
+        # Yields (tick, inputs, delta_time, state, score) from a keyframe
+        tick, offset, _, _, *state = self.keyframe(start_index)
+        score = state.pop()
+        data = self.data
+        offset += self.stream_offset
+        end_tick = min(end_tick, self.tick_count - 1)
+        while tick <= end_tick:
+            inputs = data[offset]
+            frame_us, offset = read_varint(data, offset + 1)
+            for field in range(6):
+                delta, offset = read_varint(data, offset)
+                state[field] += delta
+            delta, offset = read_varint(data, offset)
+            score += delta
+            yield tick, inputs, frame_us / 1e6, state, score
+            tick += 1
+
+    def ball_state(self, tick):
+        # Dequantised (x, y, z, vx, vy, vz) after the given tick was simulated
+        if not 0 <= tick < self.tick_count:
+            raise ReplayError(f"Tick {tick} outside replay of {self.tick_count} ticks")
+        for _, _, _, state, _ in self.decode(self.keyframe_index_for(tick), tick):
+            pass
+        return dequantise_state(state)
+
+    def scrub(self, tick):
+        # Everything needed to resimulate up to tick: the nearest snapshot and
+        # the (inputs, delta_time) of every tick from there on
+        index = self.keyframe_index_for(tick)
+        keyframe_tick, snapshot = self.keyframe_snapshot(index)
+        inputs = [(record[1], record[2]) for record in self.decode(index, tick)]
+        return keyframe_tick, snapshot, inputs
+
+    def ball_track(self):
+        # Every tick's (delta_time, state), decoded in one pass
+        for _, _, delta_time, state, _ in self.decode(0, self.tick_count - 1):
+            yield delta_time, dequantise_state(state)
+
+class _KeyframeTicks:
+    # Sequence view over the keyframe ticks so bisect can search the table
+    # without materialising it
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return self.view.keyframe_count
+
+    def __getitem__(self, index):
+        return KEYFRAME_ENTRY.unpack_from(
+            self.view.data, self.view.table_offset + index * KEYFRAME_ENTRY.size
+        )[0]
+
+class ReplayArchive:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.executor = None
+        if not os.path.exists(path) or os.path.getsize(path) < ARCHIVE_HEADER.size:
+            with open(path, "wb") as f:
+                f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0,
+                                            ARCHIVE_HEADER.size, 0, 0))
+        self.file = open(path, "r+b")
+        # (map, index offset, count, capacity), replaced as one reference so readers
+        # on other threads never mix a new map with an old index
+        self.state = None
+        self.remap()
+
+    def remap(self):
+        # The old map is left to the garbage collector since replay views
+        # handed out earlier may still point into it
+        archive_map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, _, index_offset, count, capacity = ARCHIVE_HEADER.unpack_from(
+                archive_map, 0
+            )
+        except struct.error as e:
+            raise ReplayError(f"{self.path} is not a replay archive") from e
+        if magic != ARCHIVE_MAGIC:
+            raise ReplayError(f"{self.path} is not a replay archive")
+        if version != ARCHIVE_VERSION:
+            raise ReplayError(f"Unsupported archive version {version}")
+        if index_offset + count * INDEX_ENTRY.size > len(archive_map):
+            raise ReplayError(f"{self.path} has a truncated index")
+        self.state = (archive_map, index_offset, count, max(capacity, count))
+
+    def __len__(self):
+        return self.state[2]
+
+    def entry(self, index):
+        # (offset, length, seed, tick_count, keyframe_count, recorded_at, score)
+        return self._entry(self.state, index)
+
+    def _entry(self, state, index):
+        archive_map, index_offset, count, _ = state
+        if not 0 <= index < count:
+            raise IndexError(index)
+        entry = INDEX_ENTRY.unpack_from(archive_map, index_offset + index * INDEX_ENTRY.size)
+        offset, length = entry[:2]
+        if offset < ARCHIVE_HEADER.size or offset + length > len(archive_map):
+            raise ReplayError(f"Replay {index} lies outside the archive's blobs")
+        return entry
+
+    def replay(self, index):
+        state = self.state
+        offset, length = self._entry(state, index)[:2]
+        return ReplayView(memoryview(state[0])[offset:offset + length])
+
+    def append(self, blob):
+        view = ReplayView(blob)
+        with self.lock:
+            archive_map, index_offset, count, capacity = self.state
+            offset = self.file.seek(0, os.SEEK_END)
+            new_entry = INDEX_ENTRY.pack(offset, len(blob), view.seed, view.tick_count,
+                                         view.keyframe_count, time.time(), view.score)
+            self.file.write(blob)
+            if count < capacity:
+                # The slot lies past the live count, so nothing reads it yet
+                self.file.seek(index_offset + count * INDEX_ENTRY.size)
+                self.file.write(new_entry)
+            else:
+                old_index = archive_map[index_offset:index_offset + count * INDEX_ENTRY.size]
+                index_offset = offset + len(blob)
+                capacity = max(INDEX_CHUNK, capacity * 2)
+                self.file.write(old_index)
+                self.file.write(new_entry)
+                self.file.write(bytes((capacity - count - 1) * INDEX_ENTRY.size))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+            self.file.seek(0)
+            self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0,
+                                                index_offset, count + 1, capacity))
+            self.file.flush()
+            self.remap()
+            return count
+
+    def append_async(self, blob):
+        # Keeps the disk write off the frame thread
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="replays")
+        return self.executor.submit(self.append, blob)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.file.close()
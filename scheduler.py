@@ -0,0 +1,63 @@
+import heapq
+
+# Central scheduler for timed effects: power-up expiry, combo timeout,
+# achievement banners. Timers sit in a min-heap keyed by due time, so a
+# tick only does work for the timers that actually expire.
+class Timer:
+    __slots__ = ("due", "callback", "args", "active")
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.active = True
+
+class Scheduler:
+    def __init__(self):
+        self.now = 0.0
+        self.heap = []
+        self.sequence = 0  # Tie-breaker so equal due times fire in order
+        self.cancelled = 0
+
+    def schedule(self, delay, callback, *args):
+        timer = Timer(self.now + delay, callback, args)
+        self.sequence += 1
+        heapq.heappush(self.heap, (timer.due, self.sequence, timer))
+        return timer
+
+    def cancel(self, timer):
+        # Lazy deletion: the entry stays in the heap until it surfaces or
+        # the heap is compacted
+        if timer is None or not timer.active:
+            return
+        timer.active = False
+        self.cancelled += 1
+        if self.cancelled > 32 and self.cancelled * 2 > len(self.heap):
+            self.heap = [entry for entry in self.heap if entry[2].active]
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+
+    def remaining(self, timer):
+        if timer is None or not timer.active:
+            return 0.0
+        return max(0.0, timer.due - self.now)
+
+    def update(self, delta_time):
+        self.now += delta_time
+        heap = self.heap
+        while heap and heap[0][0] <= self.now:
+            timer = heapq.heappop(heap)[2]
+            if timer.active:
+                timer.active = False
+                timer.callback(*timer.args)
+            else:
+                self.cancelled -= 1
+
+    def clear(self):
+        for entry in self.heap:
+            entry[2].active = False
+        self.heap = []
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self.heap) - self.cancelled
@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+import queue
+import sqlite3
+import threading
+import time
+
+# Persistent run history and leaderboards. Runs are queued from the frame
+# thread and inserted in batches by a writer thread with its own connection;
+# queries use a separate read connection and only ever touch the indexes,
+# so nothing scales with the size of the history.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    power_ups INTEGER NOT NULL,
+    achievements INTEGER NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs (score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_player_score ON runs (player, score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_player_time ON runs (player, finished_at DESC);
+"""
+
+INSERT_RUN = """
+INSERT INTO runs (player, score, distance, power_ups, achievements, finished_at)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+@dataclass
+class RunRecord:
+    player: str
+    score: int
+    distance: float
+    power_ups: int
+    achievements: int
+    finished_at: float
+
+def connect(path):
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+class ScoreStore:
+    def __init__(self, path, batch_size=256, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Create the schema up front so readers never race the writer
+        connection = connect(path)
+        connection.executescript(SCHEMA)
+        connection.commit()
+        connection.close()
+
+        self.reader = connect(path)
+        self.pending = queue.SimpleQueue()
+        self.stop_marker = object()
+        self.recorded = 0
+        self.thread = threading.Thread(target=self.run_writer, name="scores", daemon=True)
+        self.thread.start()
+
+    def record_run(self, player, score, distance, power_ups=0, achievements=0):
+        # Never blocks: the row is handed to the writer thread
+        self.pending.put((player, int(score), float(distance), power_ups,
+                          achievements, time.time()))
+
+    def run_writer(self):
+        connection = connect(self.path)
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Pick up whatever else has queued up, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not self.stop_marker]
+            stopping = len(rows) != len(batch)
+            if rows:
+                with connection:
+                    connection.executemany(INSERT_RUN, rows)
+                self.recorded += len(rows)
+        connection.close()
+
+    def best_score(self, player=None):
+        if player is None:
+            row = self.reader.execute("SELECT MAX(score) FROM runs").fetchone()
+        else:
+            row = self.reader.execute(
+                "SELECT MAX(score) FROM runs WHERE player = ?", (player,)
+            ).fetchone()
+        return row[0] or 0
+
+    def top_scores(self, limit=10):
+        rows = self.reader.execute(
+            "SELECT player, score, distance, power_ups, achievements, finished_at "
+            "FROM runs ORDER BY score DESC LIMIT ?", (limit,)
+        )
+        return [RunRecord(*row) for row in rows]
+
+    def player_top_scores(self, player, limit=10):
+        rows = self.reader.execute(
+            "SELECT player, score, distance, power_ups, achievements, finished_at "
+            "FROM runs WHERE player = ? ORDER BY score DESC LIMIT ?", (player, limit)
+        )
+        return [RunRecord(*row) for row in rows]
+
+    def player_recent_runs(self, player, limit=10):
+        rows = self.reader.execute(
+            "SELECT player, score, distance, power_ups, achievements, finished_at "
+            "FROM runs WHERE player = ? ORDER BY finished_at DESC LIMIT ?", (player, limit)
+        )
+        return [RunRecord(*row) for row in rows]
+
+    def close(self):
+        self.pending.put(self.stop_marker)
+        self.thread.join()
+        self.reader.close()
@@ -0,0 +1,165 @@
+from pyray import *
+import numpy as np
+
+# Hover, glow and barrier pulse are evaluated on the GPU. The CPU uploads a
+# single time value per frame and a handful of per-pass constants; each
+# instance's phase comes from its own world z so no per-object math is left.
+# Cubes are drawn instanced, one call per pass and color, from a transform
+# buffer that is allocated once and only grows.
+ANIMATION_VS = """
+#version 330
+in vec3 vertexPosition;
+in mat4 instanceTransform;
+
+uniform mat4 mvp;
+
+uniform float time;
+uniform float phaseScale;
+uniform float hoverAmplitude;
+uniform float hoverFrequency;
+uniform float glowAmplitude;
+uniform float glowFrequency;
+uniform vec3 glowAxes;
+
+void main()
+{
+    float phase = instanceTransform[3].z * phaseScale;
+    float glow = 1.0 + abs(sin(time * glowFrequency + phase)) * glowAmplitude;
+    vec3 local = vertexPosition * mix(vec3(1.0), vec3(glow), glowAxes);
+
+    vec4 world = instanceTransform * vec4(local, 1.0);
+    world.y += sin(time * hoverFrequency) * hoverAmplitude;
+    gl_Position = mvp * world;
+}
+"""
+
+ANIMATION_FS = """
+#version 330
+uniform vec4 colDiffuse;
+out vec4 finalColor;
+
+void main()
+{
+    finalColor = colDiffuse;
+}
+"""
+
+# Same constants the CPU path in levels.py uses
+POWER_UP_HOVER = (0.3, 4.0)
+POWER_UP_GLOW = (0.2, 3.0)
+BARRIER_GLOW = (0.1, 2.0)
+BARRIER_PHASE_SCALE = 0.1
+BARRIER_X = (-5.0, 5.0)
+INITIAL_INSTANCES = 256
+
+class AnimationShader:
+    def __init__(self):
+        self.shader = load_shader_from_memory(ANIMATION_VS, ANIMATION_FS)
+        self.ready = is_shader_ready(self.shader)
+        if self.ready:
+            self.shader.locs[SHADER_LOC_MATRIX_MVP] = get_shader_location(self.shader, "mvp")
+            self.shader.locs[SHADER_LOC_MATRIX_MODEL] = get_shader_location_attrib(
+                self.shader, "instanceTransform"
+            )
+        self.mesh = gen_mesh_cube(1.0, 1.0, 1.0)
+        self.material = load_material_default()
+        self.material.shader = self.shader
+        self.matrices = None
+        self.transforms = None
+        self.reserve(INITIAL_INSTANCES)
+
+        self.locations = {
+            name: get_shader_location(self.shader, name)
+            for name in ("time", "phaseScale", "hoverAmplitude", "hoverFrequency",
+                         "glowAmplitude", "glowFrequency", "glowAxes")
+        }
+        # Uniform upload buffers are allocated once and rewritten in place
+        self.float_value = ffi.new("float *")
+        self.vec3_value = ffi.new("float[3]")
+
+    def set_float(self, name, value):
+        self.float_value[0] = value
+        set_shader_value(self.shader, self.locations[name], self.float_value,
+                         SHADER_UNIFORM_FLOAT)
+
+    def set_axes(self, x, y, z):
+        self.vec3_value[0] = x
+        self.vec3_value[1] = y
+        self.vec3_value[2] = z
+        set_shader_value(self.shader, self.locations["glowAxes"], self.vec3_value,
+                         SHADER_UNIFORM_VEC3)
+
+    def set_pass(self, hover=(0.0, 0.0), glow=(0.0, 0.0), axes=(1.0, 1.0, 1.0), phase_scale=0.0):
+        self.set_float("hoverAmplitude", hover[0])
+        self.set_float("hoverFrequency", hover[1])
+        self.set_float("glowAmplitude", glow[0])
+        self.set_float("glowFrequency", glow[1])
+        self.set_float("phaseScale", phase_scale)
+        self.set_axes(*axes)
+
+    def begin_frame(self, time):
+        self.set_float("time", time)
+
+    def reserve(self, count):
+        # Grows the shared transform buffer; only translation and scale are
+        # ever written, the rest stays identity
+        if self.matrices is not None and len(self.matrices) >= count:
+            return
+        capacity = INITIAL_INSTANCES
+        while capacity < count:
+            capacity *= 2
+        self.matrices = np.zeros((capacity, 16), dtype=np.float32)
+        self.matrices[:, 15] = 1.0
+        self.transforms = ffi.from_buffer("Matrix[]", self.matrices)
+
+    def draw_cubes(self, positions, width, height, depth, color):
+        # positions: (count, 3) array of cube centres, all the same size and color
+        count = len(positions)
+        self.reserve(count)
+        matrices = self.matrices
+        matrices[:count, 0] = width
+        matrices[:count, 5] = height
+        matrices[:count, 10] = depth
+        matrices[:count, 3] = positions[:, 0]
+        matrices[:count, 7] = positions[:, 1]
+        matrices[:count, 11] = positions[:, 2]
+        self.material.maps[MATERIAL_MAP_DIFFUSE].color = color
+        draw_mesh_instanced(self.mesh, self.material, self.transforms, count)
+
+    def draw_power_ups(self, power_ups, glow):
+        # power_ups: (x, y, z, color) of the visible, active power-ups
+        if not power_ups:
+            return
+        by_color = {}
+        for x, y, z, color in power_ups:
+            by_color.setdefault(color, []).append((x, y, z))
+        groups = [(color, np.array(positions, dtype=np.float32))
+                  for color, positions in by_color.items()]
+
+        # Meshes bypass the immediate-mode batch; flush it to keep draw order
+        rl_draw_render_batch_active()
+        if glow:
+            self.set_pass(hover=POWER_UP_HOVER, glow=POWER_UP_GLOW)
+            for color, positions in groups:
+                self.draw_cubes(positions, 0.8, 0.8, 0.8, fade(color, 0.5))
+
+        # Inner cubes only hover
+        self.set_pass(hover=POWER_UP_HOVER)
+        for color, positions in groups:
+            self.draw_cubes(positions, 0.5, 0.5, 0.5, color)
+
+    def draw_barrier_glow(self, segments, segment_length, color):
+        # Glow widens and heightens the barrier but never lengthens it
+        positions = np.empty((len(segments), len(BARRIER_X), 3), dtype=np.float32)
+        positions[:, :, 0] = BARRIER_X
+        positions[:, :, 1] = 1.0
+        positions[:, :, 2] = np.asarray(segments, dtype=np.float32)[:, None]
+
+        rl_draw_render_batch_active()
+        self.set_pass(glow=BARRIER_GLOW, axes=(1.0, 1.0, 0.0),
+                      phase_scale=BARRIER_PHASE_SCALE)
+        self.draw_cubes(positions.reshape(-1, 3), 0.5, 2.0, segment_length, color)
+
+    def unload(self):
+        unload_mesh(self.mesh)
+        unload_shader(self.shader)
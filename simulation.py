@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from collections import deque
+from typing import Any
+import threading
+import time
+
+# Runs the game simulation on its own thread at a fixed tick rate, apart
+# from the render loop. After every tick the sim captures a RenderSnapshot
+# (plain tuples, never mutated afterwards) into its back buffer and flips
+# it to the front with a single reference store, so the render thread just
+# reads simulation.front and never takes a lock or sees a half-updated
+# world. Input and game commands go the other way through deques.
+#
+# With threaded=False the same tick runs inline from the render loop with
+# the frame's delta time, which is how the game ran before.
+@dataclass(frozen=True)
+class RenderSnapshot:
+    tick: int
+    sim_time: float
+    run_time: float  # Simulated seconds of play in the current run
+    balls: tuple  # (x, y, z, radius, trail color) per player
+    players: tuple  # (score, speed boost, shield, magnet, crashed) per player
+    level: tuple  # systems.render_system()
+    started: bool
+    state: Any  # GameState
+    level_number: int
+    high_score: int
+    combo_multiplier: float
+    achievements_shown: tuple  # (name, description) of banners on screen
+    achievements_unlocked: tuple  # Names
+
+class Simulation:
+    def __init__(self, step, capture, tick_rate=60, threaded=True):
+        self.step = step  # step(tick, delta_time, inputs) simulates one tick
+        self.capture = capture  # capture(tick, sim_time) -> RenderSnapshot
+        self.tick_interval = 1.0 / tick_rate
+        self.threaded = threaded
+        self.commands = deque()  # (callable, args) run on the sim thread between ticks
+        self.held = 0  # Input bits held down, replaced every frame
+        self.presses = deque()  # One-shot input bits, so no press is lost between ticks
+        self.tick = 0
+        self.sim_time = 0.0
+        self.back = None
+        self.front = capture(0, 0.0)
+        self.tick_ends = deque(maxlen=120)
+        self.tick_ms = deque(maxlen=120)
+        self.dropped_ticks = 0
+        self.running = False
+        self.thread = None
+
+    def submit(self, command, *args):
+        self.commands.append((command, args))
+
+    def set_input(self, held, pressed=0):
+        self.held = held
+        if pressed:
+            self.presses.append(pressed)
+
+    def run_tick(self, delta_time):
+        commands = self.commands
+        while commands:
+            command, args = commands.popleft()
+            command(*args)
+        inputs = self.held
+        presses = self.presses
+        while presses:
+            inputs |= presses.popleft()
+
+        start = time.perf_counter()
+        tick = self.tick + 1
+        self.step(tick, delta_time, inputs)
+        self.tick = tick
+        self.sim_time += delta_time
+        self.back = self.capture(tick, self.sim_time)
+        self.front, self.back = self.back, None  # Flip
+        end = time.perf_counter()
+        self.tick_ms.append((end - start) * 1000.0)
+        self.tick_ends.append(end)
+
+    def advance(self, delta_time):
+        # Called once per rendered frame; only ticks here when not threaded
+        if not self.threaded:
+            self.run_tick(delta_time)
+
+    def start(self):
+        if self.threaded and self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name="simulation", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        interval = self.tick_interval
+        next_tick = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                continue
+            self.run_tick(interval)
+            next_tick += interval
+            # After a long stall skip ahead instead of running a burst of
+            # catch-up ticks that would stall the renderer in turn
+            behind = int((time.perf_counter() - next_tick) / interval)
+            if behind > 4:
+                self.dropped_ticks += behind
+                next_tick += behind * interval
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def tick_rate(self):
+        # Measured ticks per second over the recent window
+        ends = self.tick_ends
+        if len(ends) < 2 or ends[-1] <= ends[0]:
+            return 0.0
+        return (len(ends) - 1) / (ends[-1] - ends[0])
+
+    def report(self):
+        tick_ms = list(self.tick_ms)
+        mean_ms = sum(tick_ms) / len(tick_ms) if tick_ms else 0.0
+        mode = "thread" if self.threaded else "inline"
+        return [f"Sim ({mode}): {self.tick_rate():.1f} Hz, {mean_ms:.2f} ms/tick, "
+                f"{self.dropped_ticks} ticks skipped"]
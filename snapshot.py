@@ -0,0 +1,302 @@
+from power_ups import POWER_UPS, POWER_UP_NAMES, TIMED_POWER_UPS
+from entities import KIND_OBSTACLE, KIND_POWER_UP, KIND_PARTICLE
+from levels import BUILD_DONE
+import os
+import random
+import struct
+
+# Compact binary snapshots of the whole simulation, used for instant
+# restarts, checkpoints and crash recovery. Everything is little-endian
+# and laid out section by section in a fixed order; bump SNAPSHOT_VERSION
+# whenever a record layout changes.
+SNAPSHOT_MAGIC = b"BGSS"
+SNAPSHOT_VERSION = 6
+
+HEADER = struct.Struct("<4sHH")
+COUNT = struct.Struct("<I")
+RNG_STATE = struct.Struct("<B625I?d")
+# Version 5 writes one record per ball and adds the crashed flag
+BALL = struct.Struct("<6ff??q4i4ff4B")
+# Remaining seconds of each timed power-up, in table order; timers are
+# rescheduled from these on restore
+POWER_UP_TIMERS = struct.Struct(f"<{len(TIMED_POWER_UPS)}d")
+# Version 4 adds where the level sits on the track and how far it is built
+LEVEL = struct.Struct("<HddBd8dqd")
+# Entities are written per kind in spawn order; version 3 stores them as
+# the entity store's components
+OBSTACLE = struct.Struct("<6f4BBfffd")
+POWER_UP = struct.Struct("<3fBff")
+PARTICLE = struct.Struct("<6f4Bfff")
+# current level index, position of the current level among the saved ones,
+# state, high score; version 6 adds the run time
+MANAGER = struct.Struct("<BBBqd")
+ACHIEVEMENT = struct.Struct("<?d")
+
+FLAG_HAS_RNG = 1
+
+class SnapshotError(Exception):
+    pass
+
+def _pack_rng(out):
+    version, internal, gauss_next = random.getstate()
+    out.append(RNG_STATE.pack(
+        version, *internal, gauss_next is not None, gauss_next or 0.0
+    ))
+
+def _pack_ball(out, ball):
+    color = ball.trail_color
+    out.append(BALL.pack(
+        ball.position.x, ball.position.y, ball.position.z,
+        ball.velocity.x, ball.velocity.y, ball.velocity.z,
+        ball.radius, ball.is_grounded, ball.crashed, ball.score,
+        ball.speed_boost_count, ball.consecutive_power_ups,
+        ball.max_combo, ball.total_power_ups,
+        ball.forward_speed, ball.max_side_speed,
+        ball.side_acceleration, ball.side_drag,
+        ball.shield_rotation,
+        color[0], color[1], color[2], color[3]
+    ))
+    out.append(POWER_UP_TIMERS.pack(
+        *(ball.power_up_remaining(name) for name in TIMED_POWER_UPS)
+    ))
+
+def _pack_level(out, level):
+    out.append(LEVEL.pack(
+        level.index, level.origin_z, level.end_z, level.build_stage, level.build_rows_to,
+        level.last_segment_z, level.segment_length, level.road_width,
+        level.next_obstacle_z, level.obstacle_start_distance,
+        level.difficulty, level.score_multiplier, level.combo_multiplier,
+        level.combo_count, level.scheduler.remaining(level.combo_timer)
+    ))
+
+    out.append(COUNT.pack(len(level.road_segments)))
+    out.append(struct.pack(f"<{len(level.road_segments)}f", *level.road_segments))
+
+    store = level.store
+    obstacles = store.slots(KIND_OBSTACLE).tolist()
+    out.append(COUNT.pack(len(obstacles)))
+    for slot in obstacles:
+        out.append(OBSTACLE.pack(
+            *store.position[slot].tolist(), *store.size[slot].tolist(),
+            *store.color[slot].tolist(),
+            int(store.motion[slot]), float(store.origin_x[slot]),
+            float(store.amplitude[slot]), float(store.rate[slot]), float(store.phase[slot])
+        ))
+
+    power_ups = store.slots(KIND_POWER_UP).tolist()
+    out.append(COUNT.pack(len(power_ups)))
+    for slot in power_ups:
+        out.append(POWER_UP.pack(
+            *store.position[slot].tolist(), int(store.type[slot]),
+            float(store.rotation[slot]), float(store.hover[slot])
+        ))
+
+    particles = store.slots(KIND_PARTICLE).tolist()
+    out.append(COUNT.pack(len(particles)))
+    for slot in particles:
+        out.append(PARTICLE.pack(
+            *store.position[slot].tolist(), *store.velocity[slot].tolist(),
+            *store.color[slot].tolist(),
+            float(store.life[slot]), float(store.max_life[slot]), float(store.scale[slot])
+        ))
+
+def _pack_manager(out, game_manager):
+    out.append(MANAGER.pack(
+        game_manager.current_level,
+        game_manager.levels.index(game_manager.current_level_data),
+        game_manager.state.value,
+        game_manager.high_score,
+        game_manager.run_time
+    ))
+    out.append(COUNT.pack(len(game_manager.achievements)))
+    for achievement in game_manager.achievements:
+        out.append(ACHIEVEMENT.pack(
+            achievement.unlocked,
+            game_manager.scheduler.remaining(achievement.show_timer)
+        ))
+
+def save_snapshot(balls, game_manager, include_rng=True):
+    out = [HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                       FLAG_HAS_RNG if include_rng else 0)]
+    if include_rng:
+        _pack_rng(out)
+    out.append(COUNT.pack(len(balls)))
+    for ball in balls:
+        _pack_ball(out, ball)
+    out.append(COUNT.pack(len(game_manager.levels)))
+    for level in game_manager.levels:
+        _pack_level(out, level)
+    _pack_manager(out, game_manager)
+    return b"".join(out)
+
+class _Reader:
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def read(self, record):
+        try:
+            values = record.unpack_from(self.view, self.offset)
+        except struct.error as e:
+            raise SnapshotError(f"Truncated snapshot at byte {self.offset}") from e
+        self.offset += record.size
+        return values
+
+    def read_count(self):
+        return self.read(COUNT)[0]
+
+    def read_floats(self, count):
+        record = struct.Struct(f"<{count}f")
+        return self.read(record)
+
+def _restore_vector(vector, x, y, z):
+    vector.x = x
+    vector.y = y
+    vector.z = z
+
+# Restoring reads and checks the whole snapshot before touching the game,
+# so a truncated or mismatched snapshot leaves the running game as it was.
+# The _read_* helpers only parse; the _apply_* helpers only assign.
+
+def _read_ball(reader):
+    return reader.read(BALL), reader.read(POWER_UP_TIMERS)
+
+def _apply_ball(ball, record):
+    values, timers = record
+    (px, py, pz, vx, vy, vz,
+     ball.radius, ball.is_grounded, ball.crashed, ball.score,
+     ball.speed_boost_count, ball.consecutive_power_ups,
+     ball.max_combo, ball.total_power_ups,
+     ball.forward_speed, ball.max_side_speed,
+     ball.side_acceleration, ball.side_drag,
+     ball.shield_rotation, r, g, b, a) = values
+    _restore_vector(ball.position, px, py, pz)
+    _restore_vector(ball.velocity, vx, vy, vz)
+    ball.trail_color = (r, g, b, a)
+    ball.power_up_timers.clear()
+    for name, remaining in zip(TIMED_POWER_UPS, timers):
+        ball.set_power_up_timer(name, remaining)
+
+def _read_entities(reader):
+    obstacles = [reader.read(OBSTACLE) for _ in range(reader.read_count())]
+    power_ups = [reader.read(POWER_UP) for _ in range(reader.read_count())]
+    for power_up in power_ups:
+        if power_up[3] >= len(POWER_UP_NAMES):
+            raise SnapshotError(f"Unknown power-up type {power_up[3]}")
+    particles = [reader.read(PARTICLE) for _ in range(reader.read_count())]
+    return obstacles, power_ups, particles
+
+def _apply_entities(store, entities):
+    # Respawned in the saved order, so spawn order survives the round trip
+    obstacles, power_ups, particles = entities
+    store.clear()
+    for px, py, pz, sx, sy, sz, r, g, b, a, motion, origin_x, amplitude, rate, phase in obstacles:
+        store.spawn_obstacle(px, py, pz, sx, sy, sz, (r, g, b, a),
+                             motion, origin_x, amplitude, rate, phase)
+    for px, py, pz, type_index, rotation, hover in power_ups:
+        store.spawn_power_up(px, py, pz, type_index,
+                             POWER_UPS[POWER_UP_NAMES[type_index]].color, rotation, hover)
+    for px, py, pz, vx, vy, vz, r, g, b, a, life_time, max_life, size in particles:
+        store.spawn_particle(px, py, pz, vx, vy, vz, (r, g, b, a), life_time, size, max_life)
+
+def _read_level(reader, game_manager):
+    values = reader.read(LEVEL)
+    if values[0] >= len(game_manager.library.levels):
+        raise SnapshotError(f"Snapshot level {values[0]} is not in the level data")
+    if values[3] > BUILD_DONE:
+        raise SnapshotError(f"Unknown level build stage {values[3]}")
+    road_segments = reader.read_floats(reader.read_count())
+    return values, road_segments, _read_entities(reader)
+
+def _apply_level(game_manager, record):
+    values, road_segments, entities = record
+    index, origin_z = values[:2]
+    level = game_manager.create_level(index, origin_z)
+    (level.end_z, level.build_stage, level.build_rows_to,
+     level.last_segment_z, level.segment_length, level.road_width,
+     level.next_obstacle_z, level.obstacle_start_distance,
+     level.difficulty, level.score_multiplier, level.combo_multiplier,
+     level.combo_count, combo_remaining) = values[2:]
+    level.combo_timer = None
+    level.set_combo_timer(combo_remaining)
+    # Reachability restarts from the open road at the next row
+    level.feasible = None
+    level.feasible_z = level.next_obstacle_z
+    level.road_segments.clear()
+    level.road_segments.extend(road_segments)
+    _apply_entities(level.store, entities)
+    return level
+
+def restore_snapshot(data, balls, game_manager, restore_rng=True):
+    reader = _Reader(data)
+    magic, version, flags = reader.read(HEADER)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("Not a game-state snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+
+    rng_state = None
+    if flags & FLAG_HAS_RNG:
+        values = reader.read(RNG_STATE)
+        gauss_next = values[-1] if values[-2] else None
+        rng_state = (values[0], tuple(values[1:626]), gauss_next)
+
+    ball_count = reader.read_count()
+    if ball_count != len(balls):
+        raise SnapshotError(f"Snapshot has {ball_count} balls, game has {len(balls)}")
+    ball_records = [_read_ball(reader) for _ in range(ball_count)]
+
+    level_count = reader.read_count()
+    if not 1 <= level_count <= 3:
+        raise SnapshotError(f"Snapshot has {level_count} live levels")
+    level_records = [_read_level(reader, game_manager) for _ in range(level_count)]
+
+    current_level, position, state, high_score, run_time = reader.read(MANAGER)
+    if position >= level_count:
+        raise SnapshotError("Snapshot current level is not one of its levels")
+    try:
+        state = type(game_manager.state)(state)
+    except ValueError as e:
+        raise SnapshotError(f"Unknown game state {state}") from e
+
+    achievement_count = reader.read_count()
+    if achievement_count != len(game_manager.achievements):
+        raise SnapshotError("Snapshot achievements do not match the game")
+    achievement_records = [reader.read(ACHIEVEMENT) for _ in range(achievement_count)]
+
+    # Everything parsed; from here on nothing can fail halfway
+    if rng_state is not None and restore_rng:
+        random.setstate(rng_state)
+
+    # Every pending timer is rebuilt from the remaining times in the snapshot
+    game_manager.scheduler.clear()
+    for ball, record in zip(balls, ball_records):
+        _apply_ball(ball, record)
+
+    # The live levels are rebuilt from the snapshot rather than reused
+    levels = [_apply_level(game_manager, record) for record in level_records]
+    game_manager.current_level = current_level
+    game_manager.high_score = high_score
+    game_manager.run_time = run_time
+    game_manager.previous_level_data = levels[position - 1] if position > 0 else None
+    game_manager.current_level_data = levels[position]
+    game_manager.next_level_data = levels[position + 1] if position + 1 < level_count else None
+    game_manager.state = state
+
+    for achievement, (unlocked, show_remaining) in zip(game_manager.achievements,
+                                                       achievement_records):
+        achievement.unlocked = unlocked
+        achievement.show_timer = None
+        if show_remaining > 0:
+            game_manager.show_achievement(achievement, show_remaining)
+
+def write_snapshot_file(path, data):
+    # Write then rename so a crash mid-write never leaves a torn checkpoint
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def read_snapshot_file(path):
+    with open(path, "rb") as f:
+        return f.read()
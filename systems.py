@@ -0,0 +1,257 @@
+from collections import deque
+from operator import itemgetter
+from entities import (
+    KIND_OBSTACLE, KIND_POWER_UP, KIND_PARTICLE, KIND_FREE,
+    MOTION_OSCILLATE, MOTION_SPIN, COLLIDER_BOX, COLLIDER_SPIN_BAR
+)
+import numpy as np
+import time
+
+# Game systems over the live levels' EntityStores, run by SystemScheduler
+# in a fixed order each tick: spawn, stream, movement, magnet, collision,
+# pickup, lifetime. Each takes (game_manager, balls, delta_time) and works on whole
+# columns; what a hit, pickup or level switch does is left to the
+# GameManager. Spawning only extends the current level, the others work on
+# every live one (the level before keeps its passed road for a while, the
+# next one starts before the current one ends).
+#
+# With several balls on the road the world is still updated once per tick:
+# spawning and streaming follow the ball in front, removal waits for the
+# one at the back, and only collision and pickup run per ball. Render runs
+# once per published frame and takes the leading ball's z instead; every
+# viewport then draws its own window of the same lists.
+PASSED_DISTANCE = 200.0  # Entities this far behind the last ball are removed
+PICKUP_RADIUS = 1.0  # Power-ups this close to a ball are collected
+MAGNET_RADIUS = 12.0  # A magnet pulls in every power-up this close, across the road
+MAGNET_PULL_SPEED = 40.0  # Faster than a boosted ball, so passed ones catch up
+
+class SystemScheduler:
+    def __init__(self, systems, window=120):
+        self.systems = systems  # (name, system) in run order
+        self.timings = {}
+        self.window = window
+        for name, _ in systems:
+            self.timings[name] = deque(maxlen=window)
+
+    def run(self, *args):
+        for name, system in self.systems:
+            self.call(name, system, *args)
+
+    def call(self, name, system, *args):
+        # Runs and times one system, including ones outside the tick order
+        start = time.perf_counter()
+        result = system(*args)
+        timings = self.timings.get(name)
+        if timings is None:
+            timings = self.timings[name] = deque(maxlen=self.window)
+        timings.append((time.perf_counter() - start) * 1000.0)
+        return result
+
+    def mean_ms(self, name):
+        timings = list(self.timings.get(name, ()))
+        return sum(timings) / len(timings) if timings else 0.0
+
+    def report(self):
+        return [f"{name}: {self.mean_ms(name):.3f} ms" for name in self.timings]
+
+def leading_ball(balls):
+    # The ball furthest down the road; balls travel towards -z
+    return min(balls, key=lambda ball: ball.position.z)
+
+def trailing_ball(balls):
+    # The racing ball furthest back; a crashed ball stays where it crashed,
+    # so it only counts once every ball has crashed
+    racing = [ball for ball in balls if not ball.crashed]
+    return max(racing or balls, key=lambda ball: ball.position.z)
+
+def spawn_system(game_manager, balls, delta_time):
+    # Road segments, obstacle rows and power-ups ahead of the leading ball
+    game_manager.current_level_data.update(delta_time, leading_ball(balls).position)
+
+def stream_system(game_manager, balls, delta_time):
+    # Builds the next level ahead of time and switches to it at the boundary
+    game_manager.stream_levels(leading_ball(balls), trailing_ball(balls))
+
+def movement_system(game_manager, balls, delta_time):
+    for level in game_manager.levels:
+        _move(level, level.store, delta_time)
+
+def _move(level, store, delta_time):
+    store.time += delta_time
+
+    # Oscillating and spinning obstacles; rate is zero everywhere else
+    store.phase += store.rate * delta_time
+    oscillating = store.motion == MOTION_OSCILLATE
+    if oscillating.any():
+        store.position[oscillating, 0] = (
+            store.origin_x[oscillating] +
+            np.sin(store.phase[oscillating]) * store.amplitude[oscillating]
+        )
+    spinning = store.motion == MOTION_SPIN
+    if spinning.any():
+        store.position[spinning, 0] = (
+            store.origin_x[spinning] +
+            np.cos(store.phase[spinning]) * store.amplitude[spinning]
+        )
+
+    # Ballistic particles; velocity and gravity are zero for everything else
+    store.position += store.velocity * delta_time
+    store.velocity[:, 1] -= store.gravity * delta_time
+
+    # Power-up spin and hover; the animation shader hovers them on the GPU
+    if level.animation is None:
+        power_ups = store.kind == KIND_POWER_UP
+        store.rotation[power_ups] += 90.0 * delta_time
+        store.hover[power_ups] = np.sin(store.time * 4) * 0.3
+
+def magnet_system(game_manager, balls, delta_time):
+    # Pulls nearby power-ups towards every ball with an active magnet. One
+    # vectorised distance test per level covers every magnet ball and
+    # power-up at once, tens of microseconds even at 500 power-ups, so
+    # there is no spatial index to keep up to date
+    magnets = [ball for ball in balls if ball.has_magnet and not ball.crashed]
+    if not magnets:
+        return
+    centers = np.array([(ball.position.x, ball.position.y, ball.position.z)
+                        for ball in magnets])
+    for store, slots in _power_up_slots(game_manager):
+        if not len(slots):
+            continue
+        # near[ball, power-up], from where the power-ups were at tick start
+        offset = centers[:, None, :] - store.position[slots]
+        near = np.einsum("bij,bij->bi", offset, offset) < MAGNET_RADIUS * MAGNET_RADIUS
+        for index in np.flatnonzero(near.any(axis=1)).tolist():
+            _pull(store, slots[near[index]], centers[index], delta_time)
+
+def _pull(store, slots, center, delta_time):
+    offset = center - store.position[slots]
+    distance = np.sqrt(np.einsum("ij,ij->i", offset, offset))
+    # Each moves straight at the ball, stopping on it rather than past it
+    step = np.minimum(MAGNET_PULL_SPEED * delta_time, distance)
+    store.position[slots] += offset * (step / np.maximum(distance, 1e-9))[:, None]
+
+def collision_system(game_manager, balls, delta_time):
+    for ball in balls:
+        if not ball.crashed:
+            _collide(game_manager, ball)
+
+def _collide(game_manager, ball):
+    # One hit per tick at most: the first obstacle touched, in spawn order
+    center = (ball.position.x, ball.position.y, ball.position.z)
+    for level in game_manager.levels:
+        slot = first_hit(level.store, center, ball.radius)
+        if slot is not None:
+            game_manager.hit_obstacle(ball, slot)
+            return
+
+def first_hit(store, center, radius):
+    # Narrow phase for a sphere against every obstacle at once. Spinning
+    # bars are boxes of their real size at the x the movement system put
+    # them at for the current spin phase, so both colliders share the
+    # exact sphere-vs-box test; the z slab check keeps the rest of the
+    # work to the few obstacles level with the ball.
+    distance = np.abs(store.position - center)
+    candidates = np.flatnonzero(
+        ((store.collider == COLLIDER_BOX) | (store.collider == COLLIDER_SPIN_BAR)) &
+        (distance[:, 2] < store.size[:, 2] / 2 + radius)
+    )
+    if not len(candidates):
+        return None
+    # Distance from the centre to the nearest point of each box
+    outside = np.maximum(distance[candidates] - store.size[candidates] / 2, 0.0)
+    hits = candidates[np.einsum("ij,ij->i", outside, outside) < radius * radius]
+    if not len(hits):
+        return None
+    return int(hits[np.argmin(store.serial[hits])])
+
+def pickup_system(game_manager, balls, delta_time):
+    # Power-ups hold still while they are collected, so their positions are
+    # gathered once and tested against every ball
+    power_ups = [(store, slots, store.position[slots])
+                 for store, slots in _power_up_slots(game_manager)]
+    for ball in balls:
+        if ball.crashed:
+            continue
+        for store, slots, positions in power_ups:
+            _pick_up(game_manager, ball, store, slots, positions)
+
+def _pick_up(game_manager, ball, store, slots, positions):
+    # Magnets pull power-ups in rather than widening this radius
+    offset = positions - (ball.position.x, ball.position.y, ball.position.z)
+    hit = slots[np.einsum("ij,ij->i", offset, offset) < PICKUP_RADIUS * PICKUP_RADIUS]
+    # Skip any a ball earlier in the list has already collected
+    hit = hit[store.kind[hit] == KIND_POWER_UP]
+    for slot in _in_spawn_order(store, hit):
+        game_manager.collect_power_up(ball, store, slot)
+
+def lifetime_system(game_manager, balls, delta_time):
+    ball = trailing_ball(balls)
+    for level in game_manager.levels:
+        _expire(level.store, ball, delta_time)
+
+def _expire(store, ball, delta_time):
+    mortal = store.max_life > 0.0
+    store.life[mortal] -= delta_time
+    expired = mortal & (store.life <= 0.0)
+    # Obstacles and power-ups go once the last ball is well past them
+    passed = (store.kind != KIND_FREE) & ~mortal & (
+        store.position[:, 2] > ball.position.z + PASSED_DISTANCE
+    )
+    store.destroy(np.flatnonzero(expired | passed))
+
+def render_system(game_manager, ball_z):
+    # Immutable copy of everything within draw distance of the leading
+    # ball, for the renderer. Entities are sorted nearest the start first
+    # (descending z, like the road) so a viewport can cut out its window
+    # with a bisect instead of walking every list.
+    levels = game_manager.levels
+    draw_limit = ball_z - game_manager.current_level_data.quality.draw_distance
+    segments = []
+    obstacle_state = []
+    power_up_state = []
+    particle_state = []
+    for level in levels:
+        segments.extend(z for z in level.road_segments if z >= draw_limit)
+        _render_entities(level.store, draw_limit, obstacle_state, power_up_state, particle_state)
+    by_z = itemgetter(2)
+    return (
+        game_manager.current_level_data.segment_length,
+        tuple(segments),
+        tuple(sorted(obstacle_state, key=by_z, reverse=True)),
+        tuple(sorted(power_up_state, key=by_z, reverse=True)),
+        tuple(sorted(particle_state, key=by_z, reverse=True)),
+    )
+
+def _render_entities(store, draw_limit, obstacle_state, power_up_state, particle_state):
+    near = store.position[:, 2] >= draw_limit
+    position = store.position
+
+    obstacles = np.flatnonzero(near & (store.kind == KIND_OBSTACLE))
+    x, y, z = position[obstacles].T.tolist()
+    width, height, depth = store.size[obstacles].T.tolist()
+    obstacle_state.extend(zip(x, y, z, width, height, depth,
+                              map(tuple, store.color[obstacles].tolist())))
+
+    power_ups = np.flatnonzero(near & (store.kind == KIND_POWER_UP))
+    x, y, z = position[power_ups].T.tolist()
+    hover_y = (position[power_ups, 1] + store.hover[power_ups]).tolist()
+    power_up_state.extend(zip(x, hover_y, z, map(tuple, store.color[power_ups].tolist())))
+
+    particles = np.flatnonzero(store.kind == KIND_PARTICLE)
+    alpha = store.life[particles] / store.max_life[particles]
+    colors = store.color[particles].copy()
+    colors[:, 3] = (255 * alpha).astype(np.uint8)
+    x, y, z = position[particles].T.tolist()
+    particle_state.extend(zip(x, y, z, (store.scale[particles] * alpha).tolist(),
+                              map(tuple, colors.tolist())))
+
+def _power_up_slots(game_manager):
+    # (store, power-up slots) of every live level, found once per system run
+    # and shared by every ball
+    return [(level.store, np.flatnonzero(level.store.kind == KIND_POWER_UP))
+            for level in game_manager.levels]
+
+def _in_spawn_order(store, slots):
+    if len(slots) > 1:
+        slots = slots[np.argsort(store.serial[slots], kind="stable")]
+    return slots.tolist()
@@ -0,0 +1,167 @@
+from collections import deque
+import json
+import struct
+import sys
+import threading
+import time
+from power_ups import POWER_UP_NAMES
+
+# Run telemetry log. The frame thread only appends small tuples to a deque;
+# a background thread encodes them in batches and writes them to disk.
+#
+# File layout: 8-byte header (magic, version) followed by records of
+#   u16 payload length | u8 event | f64 seconds since session start | payload
+TELEMETRY_MAGIC = b"BGTL"
+TELEMETRY_VERSION = 1
+
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<HBd")
+
+EVENT_RUN_START = 1
+EVENT_RUN_END = 2
+EVENT_TICK = 3
+EVENT_SPAWN = 4
+EVENT_PICKUP = 5
+EVENT_DEATH = 6
+EVENT_COMBO = 7
+EVENT_ACHIEVEMENT = 8
+EVENT_GC_PAUSE = 9
+
+# Fixed-size payloads; EVENT_ACHIEVEMENT carries a UTF-8 name instead
+PAYLOADS = {
+    EVENT_RUN_START: (struct.Struct("<I"), ("run",)),
+    EVENT_RUN_END: (struct.Struct("<Iqf"), ("run", "score", "distance")),
+    EVENT_TICK: (struct.Struct("<Iff"), ("frame", "delta_ms", "work_ms")),
+    EVENT_SPAWN: (struct.Struct("<Bff"), ("kind", "x", "z")),
+    EVENT_PICKUP: (struct.Struct("<Bff"), ("kind", "x", "z")),
+    EVENT_DEATH: (struct.Struct("<qff"), ("score", "x", "z")),
+    EVENT_COMBO: (struct.Struct("<If"), ("count", "multiplier")),
+    EVENT_GC_PAUSE: (struct.Struct("<IBfI"), ("frame", "generation", "pause_ms", "collected")),
+}
+
+EVENT_NAMES = {
+    EVENT_RUN_START: "run_start",
+    EVENT_RUN_END: "run_end",
+    EVENT_TICK: "tick",
+    EVENT_SPAWN: "spawn",
+    EVENT_PICKUP: "pickup",
+    EVENT_DEATH: "death",
+    EVENT_COMBO: "combo",
+    EVENT_ACHIEVEMENT: "achievement",
+    EVENT_GC_PAUSE: "gc_pause",
+}
+
+# Spawn/pickup kinds; obstacles use 0, power-ups use their type code
+KINDS = ("obstacle",) + POWER_UP_NAMES
+KIND_CODES = {name: code for code, name in enumerate(KINDS)}
+
+class TelemetryWriter:
+    def __init__(self, path, flush_interval=0.5, max_pending=100000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.start_time = time.perf_counter()
+        # deque.append is atomic, so the frame thread never takes a lock.
+        # When the writer falls behind the oldest events are dropped.
+        self.pending = deque(maxlen=max_pending)
+        self.written = 0
+        self.run = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run_writer, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def emit(self, event, *fields):
+        self.pending.append((event, time.perf_counter() - self.start_time, fields))
+
+    def run_started(self):
+        self.run += 1
+        self.emit(EVENT_RUN_START, self.run)
+
+    def run_ended(self, score, distance):
+        self.emit(EVENT_RUN_END, self.run, score, distance)
+
+    def tick(self, frame, delta_time, work_ms):
+        self.emit(EVENT_TICK, frame, delta_time * 1000.0, work_ms)
+
+    def spawn(self, kind, x, z):
+        self.emit(EVENT_SPAWN, KIND_CODES[kind], x, z)
+
+    def pickup(self, kind, x, z):
+        self.emit(EVENT_PICKUP, KIND_CODES[kind], x, z)
+
+    def death(self, score, x, z):
+        self.emit(EVENT_DEATH, score, x, z)
+
+    def combo(self, count, multiplier):
+        self.emit(EVENT_COMBO, count, multiplier)
+
+    def achievement(self, name):
+        self.emit(EVENT_ACHIEVEMENT, name)
+
+    def gc_pause(self, frame, generation, pause_ms, collected):
+        self.emit(EVENT_GC_PAUSE, frame, generation, pause_ms, collected)
+
+    def encode(self, event, timestamp, fields):
+        if event == EVENT_ACHIEVEMENT:
+            payload = fields[0].encode("utf-8")
+        else:
+            payload = PAYLOADS[event][0].pack(*fields)
+        return RECORD.pack(len(payload), event, timestamp) + payload
+
+    def drain(self, f):
+        chunks = []
+        pending = self.pending
+        while pending:
+            chunks.append(self.encode(*pending.popleft()))
+        if chunks:
+            f.write(b"".join(chunks))
+            f.flush()
+            self.written += len(chunks)
+
+    def run_writer(self):
+        with open(self.path, "wb") as f:
+            f.write(HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, 0))
+            while not self.stop_event.wait(self.flush_interval):
+                self.drain(f)
+            self.drain(f)
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+
+def read_events(path):
+    # Streams events back one at a time without loading the whole log
+    with open(path, "rb") as f:
+        magic, version, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != TELEMETRY_MAGIC:
+            raise ValueError(f"{path} is not a telemetry log")
+        if version != TELEMETRY_VERSION:
+            raise ValueError(f"Unsupported telemetry version {version}")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return  # End of file, or a record cut off by a crash
+            length, event, timestamp = RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            record = {"event": EVENT_NAMES.get(event, event), "time": timestamp}
+            if event == EVENT_ACHIEVEMENT:
+                record["name"] = payload.decode("utf-8")
+            elif event in PAYLOADS:
+                payload_struct, names = PAYLOADS[event]
+                record.update(zip(names, payload_struct.unpack(payload)))
+                if "kind" in record:
+                    record["kind"] = KINDS[record["kind"]]
+            yield record
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python telemetry.py LOG [EVENT...]")
+        sys.exit(1)
+    wanted = set(sys.argv[2:])
+    for record in read_events(sys.argv[1]):
+        if not wanted or record["event"] in wanted:
+            print(json.dumps(record))
+
+if __name__ == "__main__":
+    main()
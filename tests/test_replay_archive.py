@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from replays import ARCHIVE_HEADER, INDEX_CHUNK, INDEX_ENTRY, ReplayArchive, ReplayRecorder
+
+def make_replay(seed, ticks=120):
+    ball = SimpleNamespace(
+        position=SimpleNamespace(x=0.0, y=0.5, z=0.0),
+        velocity=SimpleNamespace(x=0.0, y=0.0, z=-20.0),
+        score=0,
+    )
+    recorder = ReplayRecorder(seed, ball)
+    for tick in range(ticks):
+        if recorder.needs_keyframe():
+            recorder.add_keyframe(b"snapshot %d" % tick)
+        ball.position.z -= 20.0 / 60.0
+        ball.score += 1
+        recorder.record_tick(0, 1.0 / 60.0, ball)
+    return recorder.finish(ball.score)
+
+class ReplayArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "replays.bgra")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def append_all(self, archive, seeds):
+        for seed in seeds:
+            archive.append(make_replay(seed))
+
+    def assert_replays(self, archive, seeds):
+        self.assertEqual(len(archive), len(seeds))
+        for index, seed in enumerate(seeds):
+            self.assertEqual(archive.entry(index)[2], seed)
+            self.assertEqual(bytes(archive.replay(index).data), make_replay(seed))
+
+    def test_round_trip(self):
+        archive = ReplayArchive(self.path)
+        seeds = list(range(1, 3 * INDEX_CHUNK))
+        self.append_all(archive, seeds)
+        archive.close()
+
+        archive = ReplayArchive(self.path)
+        self.assert_replays(archive, seeds)
+        archive.close()
+
+    def test_size_grows_linearly(self):
+        archive = ReplayArchive(self.path)
+        count = 4 * INDEX_CHUNK
+        self.append_all(archive, range(count))
+        archive.close()
+        data = count * len(make_replay(0))
+        # Live index plus the regions it outgrew: at most twice the live one
+        limit = ARCHIVE_HEADER.size + data + 4 * count * INDEX_ENTRY.size
+        self.assertLess(os.path.getsize(self.path), limit)
+
+    def test_crash_mid_append_keeps_previous_archive(self):
+        # Appends that fill a free index slot and ones that move the index
+        for count in (5, INDEX_CHUNK):
+            with self.subTest(count=count):
+                seeds = list(range(1, count + 1))
+                archive = ReplayArchive(self.path)
+                self.append_all(archive, seeds)
+                archive.close()
+                with open(self.path, "rb") as f:
+                    before = f.read()
+
+                archive = ReplayArchive(self.path)
+                archive.append(make_replay(999))
+                archive.close()
+                with open(self.path, "rb") as f:
+                    after = f.read()
+
+                # A crash before the header is rewritten leaves the old
+                # header and any prefix of the appended bytes
+                for cut in (len(before), (len(before) + len(after)) // 2, len(after)):
+                    crashed = before[:ARCHIVE_HEADER.size] + after[ARCHIVE_HEADER.size:cut]
+                    with open(self.path, "wb") as f:
+                        f.write(crashed)
+                    archive = ReplayArchive(self.path)
+                    self.assert_replays(archive, seeds)
+                    archive.append(make_replay(1000))
+                    self.assert_replays(archive, seeds + [1000])
+                    archive.close()
+                os.remove(self.path)
+
+if __name__ == "__main__":
+    unittest.main()